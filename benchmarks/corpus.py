@@ -0,0 +1,55 @@
+import os
+import random
+import sqlite3
+from datetime import timedelta
+
+from database import _migrate, _schedule_fields
+from utils.recurrence import LOCAL_TZ
+
+DEFAULT_TYPES = ("once", "weekly_once", "weekly_multiple")
+DAY_SETS = ["mon,wed,fri", "tue,thu", "mon,tue,wed,thu,fri", "sat", "sun", "mon,tue,wed,thu,fri,sat,sun"]
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+CRON_EXAMPLES = ["*/30 9-18 * * mon-fri", "0 12 * * *", "15 8 1,15 * *", "0 20 * * sat,sun"]
+
+
+def _random_event(rng, type_, start, days_ahead, chat_ids):
+    minute = rng.randrange(24 * 60)
+    time_ = f"{minute // 60:02d}:{minute % 60:02d}"
+    days = date = rule = None
+    if type_ == "once":
+        date = (start + timedelta(days=rng.randrange(days_ahead))).strftime("%Y-%m-%d")
+    elif type_ == "weekly_once":
+        days = rng.choice(WEEKDAYS)
+    elif type_ == "weekly_multiple":
+        days = rng.choice(DAY_SETS)
+    elif type_ == "monthly":
+        rule = str(rng.randint(1, 31))
+    elif type_ == "cron":
+        rule, time_ = rng.choice(CRON_EXAMPLES), None
+    return type_, days, date, time_, f"Ивент #{rng.randrange(10 ** 6)}", rng.choice(chat_ids), rule
+
+
+def build_corpus(path, count, start, types=DEFAULT_TYPES, chats=1, days_ahead=7, seed=0, batch=10_000):
+    """Создаёт events.db с `count` случайными ивентами, next_fire_at считается от `start`."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    chat_ids = [-1000000000000 - i for i in range(chats)]
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    _migrate(conn)
+    conn.executemany("INSERT INTO chats (chat_id, title) VALUES (?, ?)",
+                     [(chat_id, f"Чат {i}") for i, chat_id in enumerate(chat_ids)])
+    now = start.astimezone(LOCAL_TZ)
+    rows = []
+    for i in range(count):
+        event = _random_event(rng, types[i % len(types)], now, days_ahead, chat_ids)
+        rows.append((*event, *_schedule_fields(event[0], event[1], event[2], event[3], now, LOCAL_TZ, event[6])))
+        if len(rows) >= batch or i == count - 1:
+            conn.executemany(
+                "INSERT INTO events (type, days, date, time, description, chat_id, rule, "
+                "days_mask, minute_of_day, next_fire_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            rows.clear()
+    conn.commit()
+    conn.close()
+    return chat_ids
@@ -0,0 +1,80 @@
+import asyncio
+import random
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from utils.clock import MinuteClock
+from utils.recurrence import LOCAL_TZ
+
+
+class SimulatedClock(MinuteClock):
+    """Часы, в которых сон до дедлайна проходит мгновенно.
+
+    Перед каждым прыжком вперёд вызывается `settle` (например, дождаться отправки
+    уведомлений текущей минуты), а `on_tick` получает время каждого пробуждения.
+    Когда следующий дедлайн выходит за `end`, сон больше не заканчивается.
+    """
+
+    def __init__(self, start, end, tz=LOCAL_TZ, settle=None, on_tick=None):
+        super().__init__(tz)
+        self.current = start
+        self.end = end
+        self.settle = settle
+        self.on_tick = on_tick
+        self.finished = asyncio.Event()
+
+    def now(self):
+        return self.current
+
+    async def sleep_until(self, deadline, wakeup=None):
+        if self.settle:
+            await self.settle()
+        if deadline is None or deadline > self.end:
+            self.finished.set()
+            await asyncio.Event().wait()
+        self.current = max(self.current, deadline)
+        await asyncio.sleep(0)
+        if self.on_tick:
+            self.on_tick(self.current)
+        return False
+
+
+class FakeBot:
+    """Заменяет Bot в бенчмарках: запоминает вызовы, добавляет задержку и RetryAfter."""
+
+    def __init__(self, latency=0.05, jitter=0.02, retry_after_rate=0.0, retry_after=1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.sent = []          # (chat_id, monotonic-время отправки)
+        self.deleted = 0
+        self.retry_afters = 0
+        self._message_id = 0
+
+    async def _delay(self):
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._delay()
+        if self.random.random() < self.retry_after_rate:
+            self.retry_afters += 1
+            raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Too Many Requests", self.retry_after)
+        self._message_id += 1
+        self.sent.append((chat_id, time.monotonic()))
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=self._message_id, date=datetime.now())
+
+    async def delete_messages(self, chat_id, message_ids):
+        await self._delay()
+        self.deleted += len(message_ids)
+        return True
+
+    async def delete_message(self, chat_id, message_id):
+        await self._delay()
+        self.deleted += 1
+        return True
@@ -0,0 +1,252 @@
+"""Бенчмарк планировщика на синтетических корпусах ивентов.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.scheduler --events 10 10000 1000000 --days 7
+
+Для каждого размера создаётся events.db со случайными ивентами, EventScheduler
+гоняется по симулированным часам (сон до дедлайна мгновенный), отправка идёт
+через FakeBot с задержкой и RetryAfter. В отчёте — CPU и время БД на тик,
+перцентили задержки отправки и пиковая память. Каждый размер гоняется в отдельном
+процессе, поэтому пиковый RSS относится только к нему.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import database
+import utils.dispatcher as dispatcher_module
+from benchmarks.corpus import DEFAULT_TYPES, build_corpus
+from benchmarks.fakes import FakeBot, SimulatedClock
+from utils.cleanup import DeletionService
+from utils.dispatcher import NotificationDispatcher
+from utils.recurrence import LOCAL_TZ
+from utils.scheduler import EventScheduler
+
+# Понедельник, чтобы неделя симуляции покрывала все дни
+SIMULATION_START = datetime(2026, 1, 5, tzinfo=LOCAL_TZ)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def summarize(values, scale=1000):
+    # Секунды -> миллисекунды
+    return {name: (round(value * scale, 3) if value is not None else None) for name, value in (
+        ("p50", percentile(values, 50)), ("p95", percentile(values, 95)),
+        ("p99", percentile(values, 99)), ("max", max(values) if values else None))}
+
+
+class InstrumentedDispatcher(NotificationDispatcher):
+    """Считает отправленные уведомления и задержку от постановки в очередь до ответа бота."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submitted = 0
+        self.latencies = []
+
+    def submit(self, chat_id, text, on_sent=None, keys=()):
+        self.submitted += 1
+        queued_at = time.monotonic()
+
+        async def sent(msg):
+            self.latencies.append(time.monotonic() - queued_at)
+            if on_sent:
+                await on_sent(msg)
+
+        super().submit(chat_id, text, sent, keys)
+
+
+class DBTimer:
+    """Суммарное время запросов к БД (ожидание потока БД + выполнение)."""
+
+    def __init__(self):
+        self.total = 0.0
+        self._original = None
+
+    def install(self):
+        self._original = database._run
+
+        async def timed_run(fn, *args):
+            started = time.perf_counter()
+            try:
+                return await self._original(fn, *args)
+            finally:
+                self.total += time.perf_counter() - started
+
+        database._run = timed_run
+
+    def uninstall(self):
+        database._run = self._original
+
+
+class TickRecorder:
+    def __init__(self, db_timer, dispatcher):
+        self.db_timer = db_timer
+        self.dispatcher = dispatcher
+        self.ticks = []
+        self.load = None
+        self._started = None
+
+    def start(self, moment=None):
+        self._started = (moment, time.process_time(), time.perf_counter(), self.db_timer.total,
+                         self.dispatcher.submitted)
+
+    def stop(self):
+        if self._started is None:
+            return
+        moment, cpu, wall, db, submitted = self._started
+        tick = {"cpu": time.process_time() - cpu, "wall": time.perf_counter() - wall,
+                "db": self.db_timer.total - db, "sent": self.dispatcher.submitted - submitted}
+        if moment is None:
+            self.load = tick
+        else:
+            self.ticks.append(tick)
+        self._started = None
+
+
+async def run_once(count, args, db_dir):
+    db_path = os.path.join(db_dir, f"events-{count}.db")
+    started = time.perf_counter()
+    build_corpus(db_path, count, SIMULATION_START, types=args.types, chats=args.chats, days_ahead=args.days,
+                 seed=args.seed)
+    corpus_time = time.perf_counter() - started
+
+    database.DB_PATH = db_path
+    if not args.real_limits:
+        # Меряем планировщик, а не лимиты Telegram
+        dispatcher_module.GLOBAL_RATE = dispatcher_module.GROUP_RATE = dispatcher_module.PRIVATE_RATE = 1e9
+        dispatcher_module.CHAT_BURST = 1e9
+
+    bot = FakeBot(latency=args.latency / 1000, jitter=args.jitter / 1000, retry_after_rate=args.retry_after_rate,
+                  retry_after=args.retry_after, seed=args.seed)
+    dispatcher = InstrumentedDispatcher(bot, workers=args.workers)
+    db_timer = DBTimer()
+    recorder = TickRecorder(db_timer, dispatcher)
+    clock = SimulatedClock(SIMULATION_START, SIMULATION_START + timedelta(days=args.days),
+                           settle=dispatcher.join, on_tick=recorder.start)
+    # Тик заканчивается, когда планировщик снова ложится спать
+    clock_sleep = clock.sleep_until
+
+    async def sleep_until(deadline, wakeup=None):
+        recorder.stop()
+        return await clock_sleep(deadline, wakeup)
+
+    clock.sleep_until = sleep_until
+    scheduler = EventScheduler(bot, None, dispatcher, DeletionService(bot), clock=clock, digest=args.digest)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    db_timer.install()
+    dispatcher.start()
+    recorder.start()
+    task = asyncio.create_task(scheduler.run())
+    try:
+        # Логи отправки на каждое уведомление только мешают замерам
+        with open(os.devnull, "w") as devnull:
+            with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull):
+                await clock.finished.wait()
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await dispatcher.stop()
+        db_timer.uninstall()
+        await database.close()
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    ticks = recorder.ticks
+    return {
+        "events": count,
+        "simulated_days": args.days,
+        "corpus_build_s": round(corpus_time, 3),
+        "load": {key: round(value * 1000, 3) if key != "sent" else value
+                 for key, value in (recorder.load or {}).items()},
+        "ticks": len(ticks),
+        "notifications": dispatcher.submitted,
+        "delivered": len(bot.sent),
+        "retry_after": bot.retry_afters,
+        "dead_letters": len(dispatcher.dead_letters),
+        "tick_cpu_ms": summarize([t["cpu"] for t in ticks]),
+        "tick_db_ms": summarize([t["db"] for t in ticks]),
+        "tick_wall_ms": summarize([t["wall"] for t in ticks]),
+        "db_total_s": round(sum(t["db"] for t in ticks), 3),
+        "send_latency_ms": summarize(dispatcher.latencies),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_traced_mb": round(traced_peak / 2 ** 20, 1) if traced_peak is not None else None,
+    }
+
+
+def run_size(count, args, db_dir):
+    # Точка входа дочернего процесса: у каждого размера свой ru_maxrss
+    if not args.verbose:
+        # Повторы после RetryAfter ожидаемы и логируются на каждую отправку
+        logging.disable(logging.WARNING)
+    return asyncio.run(run_once(count, args, db_dir))
+
+
+def print_report(result):
+    print(f"\n=== {result['events']} ивентов, {result['simulated_days']} дн. ===")
+    print(f"корпус: {result['corpus_build_s']} с, загрузка: {result['load']}")
+    print(f"тиков: {result['ticks']}, уведомлений: {result['notifications']}, доставлено: {result['delivered']}, "
+          f"RetryAfter: {result['retry_after']}, dead letters: {result['dead_letters']}")
+    for key in ("tick_cpu_ms", "tick_db_ms", "tick_wall_ms", "send_latency_ms"):
+        print(f"{key:>16}: " + "  ".join(f"{name}={value}" for name, value in result[key].items()))
+    print(f"БД за все тики: {result['db_total_s']} с, пиковый RSS: {result['peak_rss_mb']} МБ"
+          + (f", пик tracemalloc: {result['peak_traced_mb']} МБ" if result["peak_traced_mb"] is not None else ""))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, nargs="+", default=[10, 10_000])
+    parser.add_argument("--days", type=int, default=7, help="длительность симуляции")
+    parser.add_argument("--types", nargs="+", default=list(DEFAULT_TYPES))
+    parser.add_argument("--chats", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=50, help="задержка FakeBot, мс")
+    parser.add_argument("--jitter", type=float, default=20, help="разброс задержки, мс")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="доля отправок с RetryAfter")
+    parser.add_argument("--retry-after", type=int, default=1, help="RetryAfter, с")
+    parser.add_argument("--real-limits", action="store_true", help="не отключать лимиты Telegram в диспетчере")
+    parser.add_argument("--tracemalloc", action="store_true", help="пиковая память по tracemalloc (медленнее)")
+    parser.add_argument("--db-dir", help="куда сохранить корпуса (по умолчанию временная папка)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--verbose", action="store_true", help="не скрывать вывод планировщика")
+    parser.add_argument("--digest", action="store_true", help="режим дайджеста: одно сообщение на чат за тик")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    if args.db_dir:
+        os.makedirs(args.db_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.events:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(run_size, count, args, args.db_dir or tmp).result()
+            print_report(result)
+            results.append(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,124 @@
 import asyncio
 import os
+from datetime import timedelta
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 from aiogram.client.default import DefaultBotProperties
 
+import database
 from handlers import admin
-from utils.scheduler import schedule_event_notifications
+from utils.cleanup import DeletionService
+from utils.dispatcher import NotificationDispatcher
+from utils.fsm_storage import SQLiteStorage
+from utils.leader import LeaderElection
+from utils.log import setup_logging
+from utils.metrics import register_collector, run_metrics_server
+from utils.scheduler import EventScheduler, heartbeat
+from utils.snapshot import SnapshotService
+from utils.webhook import run_webhook
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 GROUP_CHAT_ID = int(os.getenv("CHANNEL_ID", "0"))
+# Максимальное опоздание (в минутах) для уведомлений, пропущенных из-за задержек
+MAX_LATENESS_MINUTES = int(os.getenv("MAX_LATENESS_MINUTES", "15"))
+# Количество параллельных отправок уведомлений
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))
+# Идентификатор реплики; при нескольких копиях бота на общей БД рассылает только лидер
+REPLICA_ID = os.getenv("REPLICA_ID")
+# Вебхук: если WEBHOOK_URL задан, бот поднимает HTTP-сервер вместо long polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8080"))
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "32"))
+# Планировщик: loop — собственный цикл, apscheduler — задачи APScheduler в SQLite
+SCHEDULER_BACKEND = os.getenv("SCHEDULER_BACKEND", "loop")
+# Метрики Prometheus на локальном HTTP-порту (0 — выключить)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# Логи: общий уровень, уровни по модулям ("utils.scheduler=DEBUG,aiogram=WARNING"),
+# формат json|text и частота записи heartbeat (каждая N-я минута)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+HEARTBEAT_LOG_EVERY = int(os.getenv("HEARTBEAT_LOG_EVERY", "10"))
+# Плановые снимки БД; BACKUP_INTERVAL_HOURS=0 — только по /getdb
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVAL_HOURS = float(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "1") == "1"
+# Уведомления одной минуты — одним сообщением в чат
+NOTIFICATION_DIGEST = os.getenv("NOTIFICATION_DIGEST", "0") == "1"
 
 
 async def main():
     bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
     if not BOT_TOKEN or GROUP_CHAT_ID == 0:
         raise RuntimeError("❌ BOT_TOKEN или CHANNEL_ID не установлены!")
-    dp = Dispatcher(storage=MemoryStorage())
+    # Состояние мастера создания ивента хранится в БД и переживает перезапуск
+    storage = SQLiteStorage()
+    dp = Dispatcher(storage=storage)
+    election = LeaderElection(REPLICA_ID)
+    dispatcher = NotificationDispatcher(bot, workers=SEND_WORKERS, owner=election.replica_id)
+    deleter = DeletionService(bot)
+    if SCHEDULER_BACKEND == "apscheduler":
+        from utils.aps_backend import APSchedulerBackend as scheduler_cls
+    else:
+        scheduler_cls = EventScheduler
+    scheduler = scheduler_cls(bot, GROUP_CHAT_ID, dispatcher, deleter,
+                              max_lateness=timedelta(minutes=MAX_LATENESS_MINUTES),
+                              replica_id=election.replica_id, digest=NOTIFICATION_DIGEST)
+    snapshots = SnapshotService(BACKUP_DIR, timedelta(hours=BACKUP_INTERVAL_HOURS), BACKUP_KEEP, BACKUP_COMPRESS)
+    # Доступны в хендлерах как аргументы `scheduler`, `deleter` и `snapshots`
+    dp["scheduler"] = scheduler
+    dp["deleter"] = deleter
+    dp["snapshots"] = snapshots
 
     dp.include_router(admin.router)
 
-    asyncio.create_task(schedule_event_notifications(bot, GROUP_CHAT_ID))
+    # Ивенты без чата (созданные до поддержки нескольких групп) уходят в CHANNEL_ID
+    await database.assign_default_chat(GROUP_CHAT_ID)
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    storage.start()
+    dispatcher.start()
+    metrics_runner = None
+    if METRICS_PORT:
+        register_collector(database.collect_metrics)
+        metrics_runner = await run_metrics_server(METRICS_HOST, METRICS_PORT)
+    def on_external_change(changed):
+        if "events" in changed:
+            scheduler.request_reload()
+        if "deletions" in changed:
+            deleter.wake()
+
+    # Планировщик, удаление сообщений и плановые снимки работают только на реплике-лидере
+    jobs = [scheduler.run, deleter.run]
+    if BACKUP_INTERVAL_HOURS > 0:
+        jobs.append(snapshots.run)
+    election_task = asyncio.create_task(election.run(jobs, on_external_change=on_external_change))
+    asyncio.create_task(heartbeat())
+
+    try:
+        if WEBHOOK_URL:
+            await run_webhook(bot, dp, WEBHOOK_URL, host=WEBHOOK_HOST, port=PORT, secret_token=WEBHOOK_SECRET,
+                              max_concurrent_updates=MAX_CONCURRENT_UPDATES,
+                              health=lambda: {"leader": election.is_leader, "queue": dispatcher.qsize()})
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
+    finally:
+        election_task.cancel()
+        await asyncio.gather(election_task, return_exceptions=True)
+        await dispatcher.stop()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await storage.close()
+        await database.close()
 
 
 if __name__ == "__main__":
+    setup_logging(LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, HEARTBEAT_LOG_EVERY)
     asyncio.run(main())
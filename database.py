@@ -1,30 +1,768 @@
+import asyncio
+import logging
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
-conn = sqlite3.connect("events.db")
-cursor = conn.cursor()
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS events (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    type TEXT,
-    days TEXT,
-    date TEXT,
-    time TEXT,
-    description TEXT
-)
-''')
-conn.commit()
-
-def add_event(event_type, days, date, time, description):
-    print(f"Проверка ивента: type={event_type}, days={days}, date={date}, time={time}")
-    cursor.execute("INSERT INTO events (type, days, date, time, description) VALUES (?, ?, ?, ?, ?)",
-                   (event_type, days, date, time, description))
-    conn.commit()
-
-def get_all_events():
-    cursor.execute("SELECT * FROM events")
-    return cursor.fetchall()
-
-def delete_event(event_id):
-    cursor.execute("DELETE FROM events WHERE id = ?", (event_id,))
-    conn.commit()
+from models import Event
+from utils.metrics import DB_QUERY_SECONDS, FSM_SESSIONS, PENDING_DELETIONS
+from utils.event_cache import EventCache
+from utils.i18n import DEFAULT_LOCALE
+from utils.recurrence import (DEFAULT_TZ_NAME, LOCAL_TZ, compile_rule, days_to_mask, format_reminders, get_timezone,
+                              next_notification, time_to_minute)
+from utils.transfer import BATCH_SIZE, TransferError, batched, read_records, validated, write_records
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "events.db"
+
+EVENT_COLUMNS = "id, type, days, date, time, description, chat_id, rule, reminders"
+DEFAULT_DELETE_AFTER = 600
+# events — ивенты, доп. чаты, чаты и шаблоны; deletions — очередь удаления сообщений
+REVISIONS = ("events", "deletions")
+
+# Все запросы выполняются в одном выделенном потоке с собственным соединением:
+# event loop не блокируется на I/O, а запись в SQLite остаётся однопоточной.
+_executor = None
+_conn = None
+# Ивенты процесса в памяти: читаются из БД один раз, дальше обновляются write-through
+event_cache = EventCache()
+
+
+# --- Миграции ---
+# Номер применённой миграции хранится в PRAGMA user_version.
+# Новые миграции только добавляются в конец списка.
+
+def _migration_initial(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT,
+        days TEXT,
+        date TEXT,
+        time TEXT,
+        description TEXT
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS pending_deletions (
+        chat_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        delete_at INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, message_id)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_deletions_delete_at ON pending_deletions (delete_at)")
+
+
+def _migration_schedule_columns(conn):
+    # Дни недели битовой маской, время минутой суток, ближайшее срабатывание unix-временем
+    conn.execute("ALTER TABLE events ADD COLUMN days_mask INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE events ADD COLUMN minute_of_day INTEGER")
+    conn.execute("ALTER TABLE events ADD COLUMN next_fire_at INTEGER")
+    now = datetime.now(_V2_TZ).replace(second=0, microsecond=0)
+    rows = conn.execute("SELECT id, type, days, date, time FROM events").fetchall()
+    conn.executemany(
+        "UPDATE events SET days_mask = ?, minute_of_day = ?, next_fire_at = ? WHERE id = ?",
+        [(*_v2_schedule_fields(type_, days, date, time_, now), event_id) for event_id, type_, days, date, time_ in rows])
+    conn.execute("CREATE INDEX idx_events_next_fire_at ON events (next_fire_at)")
+    conn.execute("CREATE INDEX idx_events_minute_of_day ON events (minute_of_day)")
+    conn.execute("CREATE INDEX idx_events_days_mask ON events (days_mask)")
+
+
+# Заполнение колонок миграции 2 — копия логики приложения на момент этой миграции
+# (пояс UTC+3, только разовые и еженедельные ивенты). Код приложения её не использует,
+# поэтому его правки не меняют то, как обновляется старая БД
+_V2_TZ = timezone(timedelta(hours=3))
+_V2_WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+_V2_WEEKLY_TYPES = ("weekly", "weekly_once", "weekly_multiple")
+
+
+def _v2_schedule_fields(type_, days, date, time_, now):
+    weekdays = {_V2_WEEKDAYS.index(d.strip().lower()) for d in (days or "").split(",")
+                if d.strip().lower() in _V2_WEEKDAYS}
+    mask = sum(1 << weekday for weekday in weekdays)
+    try:
+        at = datetime.strptime(time_.strip(), "%H:%M")
+    except (AttributeError, ValueError):
+        return mask, None, None
+    fire_at = None
+    if type_ == "once":
+        try:
+            fire_at = datetime.strptime(date, "%Y-%m-%d").replace(hour=at.hour, minute=at.minute, tzinfo=_V2_TZ)
+        except (TypeError, ValueError):
+            pass
+        if fire_at is not None and fire_at < now:
+            fire_at = None
+    elif type_ in _V2_WEEKLY_TYPES and weekdays:
+        start = now.replace(hour=at.hour, minute=at.minute)
+        for shift in range(8):
+            candidate = start + timedelta(days=shift)
+            if candidate >= now and candidate.weekday() in weekdays:
+                fire_at = candidate
+                break
+    return mask, at.hour * 60 + at.minute, _timestamp(fire_at)
+
+
+def _migration_chats(conn):
+    # Целевой чат ивента (NULL — чат по умолчанию из CHANNEL_ID), настройки чатов
+    # и дополнительные чаты для рассылки одного ивента в несколько групп
+    conn.execute("ALTER TABLE events ADD COLUMN chat_id INTEGER")
+    conn.execute("CREATE INDEX idx_events_chat_id ON events (chat_id)")
+    conn.execute(f'''
+    CREATE TABLE chats (
+        chat_id INTEGER PRIMARY KEY,
+        title TEXT,
+        timezone TEXT NOT NULL DEFAULT '{DEFAULT_TZ_NAME}',
+        delete_after INTEGER NOT NULL DEFAULT {DEFAULT_DELETE_AFTER}
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE event_targets (
+        event_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        PRIMARY KEY (event_id, chat_id)
+    )
+    ''')
+    conn.execute("CREATE INDEX idx_event_targets_chat_id ON event_targets (chat_id)")
+
+
+def _migration_leases(conn):
+    # Аренда лидерства для нескольких реплик и отметка о захвате срабатывания
+    conn.execute('''
+    CREATE TABLE leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''')
+    conn.execute("ALTER TABLE events ADD COLUMN last_fired_at INTEGER")
+    conn.execute("ALTER TABLE events ADD COLUMN claimed_by TEXT")
+
+
+def _migration_fsm(conn):
+    # Состояния мастера создания ивента (FSM aiogram) с истечением по TTL
+    conn.execute('''
+    CREATE TABLE fsm_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT,
+        expires_at REAL NOT NULL
+    )
+    ''')
+    conn.execute("CREATE INDEX idx_fsm_states_expires_at ON fsm_states (expires_at)")
+
+
+def _migration_rules(conn):
+    # Параметр правила повторения: число месяца для monthly, выражение для cron
+    conn.execute("ALTER TABLE events ADD COLUMN rule TEXT")
+
+
+def _migration_deliveries(conn):
+    # Журнал доставки: строка на каждое (срабатывание, чат). pending пишется вместе
+    # с захватом срабатывания, sent/failed — после отправки; pending после падения дослать
+    conn.execute('''
+    CREATE TABLE deliveries (
+        event_id INTEGER NOT NULL,
+        fire_at INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        text TEXT,
+        message_id INTEGER,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (event_id, fire_at, chat_id)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX idx_deliveries_pending ON deliveries (fire_at) WHERE status = 'pending'")
+    conn.execute("CREATE INDEX idx_deliveries_fire_at ON deliveries (fire_at)")
+
+
+def _migration_templates(conn):
+    # Язык чата и шаблоны уведомлений: по типу ивента для чата (chat_id = 0 — для всех чатов)
+    conn.execute(f"ALTER TABLE chats ADD COLUMN locale TEXT NOT NULL DEFAULT '{DEFAULT_LOCALE}'")
+    conn.execute('''
+    CREATE TABLE templates (
+        chat_id INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        template TEXT NOT NULL,
+        PRIMARY KEY (chat_id, type)
+    ) WITHOUT ROWID
+    ''')
+
+
+def _migration_reminders(conn):
+    # Напоминания за N минут до срабатывания: "15,60". Отдельных строк не создают,
+    # next_fire_at ивента — ближайшее из его уведомлений
+    conn.execute("ALTER TABLE events ADD COLUMN reminders TEXT")
+
+
+def _migration_revisions(conn):
+    # Счётчики изменений: по ним реплики замечают чужие правки. PRAGMA data_version
+    # для этого не годится — его меняет любая запись другого соединения (аренда,
+    # FSM, журнал доставок, задачи APScheduler)
+    conn.execute("CREATE TABLE revisions (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID")
+    conn.executemany("INSERT INTO revisions (name, value) VALUES (?, 0)", [(name,) for name in REVISIONS])
+
+
+def _migration_delivery_owner(conn):
+    # Доставку перед отправкой захватывает диспетчер реплики (pending -> sending),
+    # поэтому бывший и новый лидер не отправят её оба
+    conn.execute("ALTER TABLE deliveries ADD COLUMN owner TEXT")
+
+
+MIGRATIONS = [
+    _migration_initial,
+    _migration_schedule_columns,
+    _migration_chats,
+    _migration_leases,
+    _migration_fsm,
+    _migration_rules,
+    _migration_deliveries,
+    _migration_templates,
+    _migration_reminders,
+    _migration_revisions,
+    _migration_delivery_owner,
+]
+
+
+def _migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def _schedule_fields(type_, days, date, time_, now, tz=LOCAL_TZ, rule=None, reminders=()):
+    # next_fire_at — ближайшее уведомление ивента: срабатывание или напоминание перед ним
+    compiled = compile_rule(type_, days, date, time_, tz, rule)
+    notify_at = None
+    if compiled:
+        notify_at = min((item[0] for item in (next_notification(compiled, now, offset) for offset in (0, *reminders))
+                         if item), default=None)
+    return days_to_mask(days), time_to_minute(time_), _timestamp(notify_at)
+
+
+def _timestamp(moment):
+    return int(moment.timestamp()) if moment else None
+
+
+def _connect():
+    global _conn
+    # sqlite3 кэширует подготовленные выражения по тексту SQL
+    _conn = sqlite3.connect(DB_PATH, cached_statements=256)
+    _conn.execute("PRAGMA journal_mode=WAL")
+    _conn.execute("PRAGMA synchronous=NORMAL")
+    _migrate(_conn)
+
+
+async def _run(fn, *args):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db", initializer=_connect)
+    loop = asyncio.get_running_loop()
+    with DB_QUERY_SECONDS.time(query=fn.__name__.lstrip("_")):
+        return await loop.run_in_executor(_executor, fn, *args)
+
+
+def _chat_timezone(chat_id):
+    row = _conn.execute("SELECT timezone FROM chats WHERE chat_id = ?", (chat_id,)).fetchone()
+    return (get_timezone(row[0]) if row else None) or LOCAL_TZ
+
+
+def _add_event(event_type, days, date, time, description, chat_id, targets, rule, reminders):
+    tz = _chat_timezone(chat_id)
+    now = datetime.now(tz).replace(second=0, microsecond=0)
+    fields = _schedule_fields(event_type, days, date, time, now, tz, rule, reminders)
+    cur = _conn.execute(
+        "INSERT INTO events (type, days, date, time, description, chat_id, rule, reminders, "
+        "days_mask, minute_of_day, next_fire_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (event_type, days, date, time, description, chat_id, rule, format_reminders(reminders), *fields))
+    _conn.executemany("INSERT OR IGNORE INTO event_targets (event_id, chat_id) VALUES (?, ?)",
+                      [(cur.lastrowid, target) for target in targets or () if target != chat_id])
+    _bump_revision("events")
+    _conn.commit()
+    return cur.lastrowid
+
+
+def _set_reminders(event_id, reminders):
+    row = _conn.execute("SELECT type, days, date, time, chat_id, rule FROM events WHERE id = ?", (event_id,)).fetchone()
+    if row is None:
+        return False
+    type_, days, date, time_, chat_id, rule = row
+    tz = _chat_timezone(chat_id)
+    now = datetime.now(tz).replace(second=0, microsecond=0)
+    next_fire_at = _schedule_fields(type_, days, date, time_, now, tz, rule, reminders)[2]
+    _conn.execute("UPDATE events SET reminders = ?, next_fire_at = ? WHERE id = ?",
+                  (format_reminders(reminders), next_fire_at, event_id))
+    _bump_revision("events")
+    _conn.commit()
+    return True
+
+
+def _import_events(path, fmt, default_chat_id, batch_size):
+    # Файл читается построчно прямо в потоке БД, все пачки — одна транзакция:
+    # при любой ошибке валидации не сохраняется ничего
+    insert = ("INSERT INTO events (type, days, date, time, description, chat_id, rule, reminders, "
+              "days_mask, minute_of_day, next_fire_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    errors = []
+    zones = {}
+    count = 0
+    with open(path, encoding="utf-8-sig", newline="") as f, _conn:
+        for batch in batched(validated(read_records(f, fmt), default_chat_id, errors), batch_size):
+            plain = []
+            for type_, days, date, time_, description, chat_id, rule, targets, reminders in batch:
+                if chat_id not in zones:
+                    tz = _chat_timezone(chat_id)
+                    zones[chat_id] = (tz, datetime.now(tz).replace(second=0, microsecond=0))
+                tz, now = zones[chat_id]
+                row = (type_, days, date, time_, description, chat_id, rule, format_reminders(reminders),
+                       *_schedule_fields(type_, days, date, time_, now, tz, rule, reminders))
+                if not targets:
+                    plain.append(row)
+                    continue
+                # Ивентам с доп. чатами нужен id, их немного — вставляем по одному,
+                # сохраняя порядок строк файла
+                _conn.executemany(insert, plain)
+                plain.clear()
+                cur = _conn.execute(insert, row)
+                _conn.executemany("INSERT OR IGNORE INTO event_targets (event_id, chat_id) VALUES (?, ?)",
+                                  [(cur.lastrowid, target) for target in targets if target != chat_id])
+            _conn.executemany(insert, plain)
+            count += len(batch)
+        if errors:
+            raise TransferError(errors)
+        _bump_revision("events")
+    return count
+
+
+def _export_events(path, fmt):
+    rows = _conn.execute(
+        "SELECT type, days, date, time, description, chat_id, rule, "
+        "(SELECT group_concat(chat_id) FROM event_targets WHERE event_id = events.id), reminders "
+        "FROM events ORDER BY id")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        return write_records(f, rows, fmt)
+
+
+def _due_event_from_row(cursor, row):
+    return Event(*row[:-1]), row[-1]
+
+
+def _get_all_events():
+    cur = _conn.cursor()
+    cur.row_factory = Event.from_row
+    return cur.execute(f"SELECT {EVENT_COLUMNS} FROM events").fetchall()
+
+
+def _load_events():
+    return _get_all_events(), _get_event_targets()
+
+
+def _get_due_events(since, until):
+    cur = _conn.cursor()
+    cur.row_factory = _due_event_from_row
+    return cur.execute(
+        f"SELECT {EVENT_COLUMNS}, next_fire_at FROM events WHERE next_fire_at BETWEEN ? AND ? ORDER BY next_fire_at",
+        (since, until)).fetchall()
+
+
+def _set_next_fire_at(items):
+    _conn.executemany("UPDATE events SET next_fire_at = ? WHERE id = ?", items)
+    _conn.commit()
+
+
+def _claim_occurrences(items, replica_id, deliveries):
+    # Срабатывание забирает ровно одна реплика: UPDATE проходит, только если
+    # это срабатывание (или более позднее) ещё никто не захватил. В той же транзакции
+    # пишутся pending-доставки, поэтому падение после захвата не теряет уведомления
+    claimed = set()
+    now = time.time()
+    with _conn:
+        for event_id, fire_at, next_fire_at in items:
+            cur = _conn.execute(
+                "UPDATE events SET last_fired_at = ?, next_fire_at = ?, claimed_by = ? "
+                "WHERE id = ? AND (last_fired_at IS NULL OR last_fired_at < ?)",
+                (fire_at, next_fire_at, replica_id, event_id, fire_at))
+            if cur.rowcount:
+                claimed.add((event_id, fire_at))
+        _conn.executemany(
+            "INSERT OR IGNORE INTO deliveries (event_id, fire_at, chat_id, text, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(*key, chat_id, text, now) for key in claimed for chat_id, text in deliveries.get(key, ())])
+    return claimed
+
+
+def _claim_deliveries(keys, owner):
+    # Отправляет только тот, кто перевёл строку из pending в sending
+    claimed = []
+    now = time.time()
+    with _conn:
+        for key in keys:
+            cur = _conn.execute(
+                "UPDATE deliveries SET status = 'sending', owner = ?, updated_at = ? "
+                "WHERE event_id = ? AND fire_at = ? AND chat_id = ? AND status = 'pending'",
+                (owner, now, *key))
+            if cur.rowcount:
+                claimed.append(key)
+    return claimed
+
+
+def _finish_delivery(keys, status, message_id):
+    now = time.time()
+    with _conn:
+        _conn.executemany("UPDATE deliveries SET status = ?, message_id = ?, updated_at = ? "
+                          "WHERE event_id = ? AND fire_at = ? AND chat_id = ?",
+                          [(status, message_id, now, *key) for key in keys])
+
+
+def _get_pending_deliveries(since):
+    return _conn.execute(
+        "SELECT event_id, fire_at, chat_id, text FROM deliveries "
+        "WHERE status = 'pending' AND fire_at >= ? ORDER BY fire_at", (since,)).fetchall()
+
+
+def _cleanup_deliveries(expire_before, purge_before):
+    with _conn:
+        # Недосланное дольше допустимого опоздания уже не отправляем; sending здесь —
+        # доставки реплики, упавшей посреди отправки: ушли ли они, неизвестно
+        _conn.execute("UPDATE deliveries SET status = 'expired', updated_at = ? "
+                      "WHERE status IN ('pending', 'sending') AND fire_at < ?", (time.time(), expire_before))
+        _conn.execute("DELETE FROM deliveries WHERE fire_at < ?", (purge_before,))
+
+
+def _acquire_lease(name, holder, ttl):
+    now = time.time()
+    with _conn:
+        _conn.execute("INSERT OR IGNORE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                      (name, holder, now + ttl))
+        cur = _conn.execute("UPDATE leases SET holder = ?, expires_at = ? "
+                            "WHERE name = ? AND (holder = ? OR expires_at < ?)",
+                            (holder, now + ttl, name, holder, now))
+    return cur.rowcount == 1
+
+
+def _release_lease(name, holder):
+    with _conn:
+        _conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+
+# name -> последнее известное этому процессу значение счётчика изменений
+_revisions = {}
+
+
+def _bump_revision(name):
+    # Вызывается в транзакции записи перед commit. Свою запись процесс учитывает сразу,
+    # если до неё счётчик не менялся другими репликами — иначе их правки заметит
+    # следующая проверка
+    value = _conn.execute("UPDATE revisions SET value = value + 1 WHERE name = ? RETURNING value",
+                          (name,)).fetchall()[0][0]
+    if _revisions.get(name) == value - 1:
+        _revisions[name] = value
+
+
+def _external_changes():
+    changed = set()
+    for name, value in _conn.execute("SELECT name, value FROM revisions"):
+        if name in _revisions and _revisions[name] != value:
+            changed.add(name)
+        _revisions[name] = value
+    return changed
+
+
+def _fsm_get(key, column):
+    row = _conn.execute(f"SELECT {column} FROM fsm_states WHERE key = ? AND expires_at >= ?",
+                        (key, time.time())).fetchone()
+    return row[0] if row else None
+
+
+def _fsm_write(states, datas, expires_at):
+    with _conn:
+        _conn.executemany(
+            "INSERT INTO fsm_states (key, state, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at",
+            [(key, state, expires_at) for key, state in states])
+        _conn.executemany(
+            "INSERT INTO fsm_states (key, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+            [(key, data, expires_at) for key, data in datas])
+        # Пустые сессии (state сброшен, данных нет) не храним
+        _conn.executemany("DELETE FROM fsm_states WHERE key = ? AND state IS NULL AND (data IS NULL OR data = '{}')",
+                          [(key,) for key in {key for key, _ in states} | {key for key, _ in datas}])
+
+
+def _fsm_purge():
+    with _conn:
+        return _conn.execute("DELETE FROM fsm_states WHERE expires_at < ?", (time.time(),)).rowcount
+
+
+def _delete_event(event_id):
+    _conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+    _conn.execute("DELETE FROM event_targets WHERE event_id = ?", (event_id,))
+    _bump_revision("events")
+    _conn.commit()
+
+
+def _assign_default_chat(chat_id):
+    _conn.execute("INSERT OR IGNORE INTO chats (chat_id) VALUES (?)", (chat_id,))
+    _conn.execute("UPDATE events SET chat_id = ? WHERE chat_id IS NULL", (chat_id,))
+    _bump_revision("events")
+    _conn.commit()
+
+
+def _get_event_targets():
+    return _conn.execute("SELECT event_id, chat_id FROM event_targets").fetchall()
+
+
+def _get_chats():
+    return _conn.execute("SELECT chat_id, title, timezone, delete_after, locale FROM chats ORDER BY chat_id").fetchall()
+
+
+def _upsert_chat(chat_id, title):
+    _conn.execute("INSERT INTO chats (chat_id, title) VALUES (?, ?) "
+                  "ON CONFLICT (chat_id) DO UPDATE SET title = COALESCE(excluded.title, title)",
+                  (chat_id, title))
+    _bump_revision("events")
+    _conn.commit()
+
+
+def _update_chat(chat_id, timezone, delete_after, locale):
+    _conn.execute("UPDATE chats SET timezone = COALESCE(?, timezone), delete_after = COALESCE(?, delete_after), "
+                  "locale = COALESCE(?, locale) WHERE chat_id = ?", (timezone, delete_after, locale, chat_id))
+    _bump_revision("events")
+    _conn.commit()
+
+
+def _get_templates():
+    return _conn.execute("SELECT chat_id, type, template FROM templates ORDER BY chat_id, type").fetchall()
+
+
+def _set_template(chat_id, type_, template):
+    if template is None:
+        _conn.execute("DELETE FROM templates WHERE chat_id = ? AND type = ?", (chat_id, type_))
+    else:
+        _conn.execute("INSERT OR REPLACE INTO templates (chat_id, type, template) VALUES (?, ?, ?)",
+                      (chat_id, type_, template))
+    _bump_revision("events")
+    _conn.commit()
+
+
+def _add_pending_deletions(items):
+    _conn.executemany("INSERT OR REPLACE INTO pending_deletions (chat_id, message_id, delete_at) VALUES (?, ?, ?)",
+                      items)
+    _bump_revision("deletions")
+    _conn.commit()
+
+
+def _get_next_deletion_at():
+    return _conn.execute("SELECT MIN(delete_at) FROM pending_deletions").fetchone()[0]
+
+
+def _get_due_deletions(until, limit):
+    return _conn.execute(
+        "SELECT chat_id, message_id FROM pending_deletions WHERE delete_at <= ? ORDER BY delete_at LIMIT ?",
+        (until, limit)).fetchall()
+
+
+def _remove_pending_deletions(items):
+    _conn.executemany("DELETE FROM pending_deletions WHERE chat_id = ? AND message_id = ?", items)
+    _conn.commit()
+
+
+def _count_sessions():
+    pending = _conn.execute("SELECT COUNT(*) FROM pending_deletions").fetchone()[0]
+    fsm = _conn.execute("SELECT COUNT(*) FROM fsm_states WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+    return pending, fsm
+
+
+def events_version():
+    # Растёт при каждом изменении ивентов — по нему сбрасываются производные кэши
+    return event_cache.version
+
+
+async def _cached_events():
+    while not event_cache.loaded:
+        version = event_cache.version
+        events, targets = await _run(_load_events)
+        # Если за время чтения ивенты поменялись, снимок уже устарел — читаем заново
+        if event_cache.version == version:
+            event_cache.load(events, targets)
+    return event_cache
+
+
+async def add_event(event_type, days, date, time, description, chat_id=None, targets=None, rule=None, reminders=()):
+    logger.info(f"Проверка ивента: type={event_type}, days={days}, date={date}, time={time}, rule={rule}, "
+                f"chat={chat_id}, reminders={reminders}")
+    event_id = await _run(_add_event, event_type, days, date, time, description, chat_id, targets, rule, reminders)
+    event_cache.put(Event(event_id, event_type, days, date, time, description, chat_id, rule, reminders),
+                    [target for target in targets or () if target != chat_id])
+    return event_id
+
+
+async def set_reminders(event_id, reminders):
+    # Возвращает обновлённый Event или None, если ивента нет
+    event = await get_event(event_id)
+    if event is None or not await _run(_set_reminders, event_id, reminders):
+        return None
+    event = Event(event.id, event.type, event.days, event.date, event.time, event.description, event.chat_id,
+                  event.rule, reminders)
+    event_cache.put(event)
+    return event
+
+
+async def import_events(path, fmt, default_chat_id, batch_size=BATCH_SIZE):
+    # Возвращает число добавленных ивентов или бросает TransferError со списком ошибок
+    try:
+        return await _run(_import_events, path, fmt, default_chat_id, batch_size)
+    finally:
+        event_cache.invalidate()
+
+
+async def export_events(path, fmt):
+    return await _run(_export_events, path, fmt)
+
+
+async def get_all_events():
+    return (await _cached_events()).all()
+
+
+async def get_event(event_id):
+    return (await _cached_events()).get(event_id)
+
+
+async def get_due_events(since, until):
+    # [(Event, next_fire_at)] с next_fire_at в окне [since, until] (unix-время), запрос по индексу
+    return await _run(_get_due_events, since, until)
+
+
+async def set_next_fire_at(items):
+    # items: [(next_fire_at, event_id), ...]
+    await _run(_set_next_fire_at, items)
+
+
+async def claim_occurrences(items, replica_id, deliveries=None):
+    # items: [(event_id, fire_at, next_fire_at), ...]; deliveries: {(event_id, fire_at): [(chat_id, text), ...]}
+    # Возвращает захваченные (event_id, fire_at)
+    return await _run(_claim_occurrences, items, replica_id, deliveries or {})
+
+
+async def claim_deliveries(keys, owner):
+    # keys: [(event_id, fire_at, chat_id)]; возвращает захваченные из них
+    return await _run(_claim_deliveries, keys, owner)
+
+
+async def finish_delivery(keys, status, message_id=None):
+    # keys: [(event_id, fire_at, chat_id)] — доставки, ушедшие одним сообщением; status: "sent" или "failed"
+    await _run(_finish_delivery, keys, status, message_id)
+
+
+async def get_pending_deliveries(since):
+    return await _run(_get_pending_deliveries, since)
+
+
+async def cleanup_deliveries(expire_before, purge_before):
+    await _run(_cleanup_deliveries, expire_before, purge_before)
+
+
+async def acquire_lease(name, holder, ttl):
+    return await _run(_acquire_lease, name, holder, ttl)
+
+
+async def release_lease(name, holder):
+    await _run(_release_lease, name, holder)
+
+
+async def has_external_changes():
+    # Множество счётчиков из REVISIONS, изменённых другими репликами с прошлой проверки
+    changed = await _run(_external_changes)
+    if "events" in changed:
+        event_cache.invalidate()
+    return changed
+
+
+async def fsm_get(key, column):
+    # column: "state" или "data"; истёкшие сессии не возвращаются
+    return await _run(_fsm_get, key, column)
+
+
+async def fsm_write(states, datas, expires_at):
+    await _run(_fsm_write, states, datas, expires_at)
+
+
+async def fsm_purge():
+    return await _run(_fsm_purge)
+
+
+async def delete_event(event_id):
+    await _run(_delete_event, event_id)
+    event_cache.remove(event_id)
+
+
+async def assign_default_chat(chat_id):
+    # Регистрирует чат по умолчанию и привязывает к нему ивенты без чата
+    await _run(_assign_default_chat, chat_id)
+    event_cache.invalidate()
+
+
+async def get_event_targets():
+    return (await _cached_events()).targets()
+
+
+async def get_chats():
+    return await _run(_get_chats)
+
+
+async def upsert_chat(chat_id, title=None):
+    await _run(_upsert_chat, chat_id, title)
+
+
+async def update_chat(chat_id, timezone=None, delete_after=None, locale=None):
+    await _run(_update_chat, chat_id, timezone, delete_after, locale)
+
+
+async def get_templates():
+    return await _run(_get_templates)
+
+
+async def set_template(chat_id, type_, template):
+    # template=None — вернуть шаблон по умолчанию
+    await _run(_set_template, chat_id, type_, template)
+
+
+async def add_pending_deletions(items):
+    # items: [(chat_id, message_id, delete_at)]
+    await _run(_add_pending_deletions, items)
+
+
+async def get_next_deletion_at():
+    return await _run(_get_next_deletion_at)
+
+
+async def get_due_deletions(until, limit=500):
+    return await _run(_get_due_deletions, until, limit)
+
+
+async def remove_pending_deletions(items):
+    await _run(_remove_pending_deletions, items)
+
+
+async def collect_metrics():
+    # Вызывается при каждом запросе /metrics
+    pending, fsm = await _run(_count_sessions)
+    PENDING_DELETIONS.set(pending)
+    FSM_SESSIONS.set(fsm)
+
+
+async def close():
+    global _executor
+    if _executor is None:
+        return
+    await _run(_conn.close)
+    _executor.shutdown(wait=True)
+    _executor = None
+    event_cache.invalidate()
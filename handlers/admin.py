@@ -1,15 +1,27 @@
+import html
 import os
+import tempfile
+import time
 
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
 from states import EventCreation
-from database import add_event, get_all_events, delete_event
-from asyncio import sleep
+from database import (add_event, get_event, get_all_events, delete_event, get_chats, upsert_chat, update_chat,
+                      events_version, import_events, export_events, get_templates, set_template, set_reminders)
 from dotenv import load_dotenv
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
+from models import Event, EventType
+from utils.recurrence import DEFAULT_TZ_NAME, compile_rule, days_to_mask, get_timezone, parse_reminders, parse_time
+from utils.cleanup import DeletionService
+from utils.i18n import LOCALES, format_days, format_minutes, type_name
+from utils.scheduler import SchedulerBackend
+from utils.snapshot import SnapshotService
+from utils.templates import ALL_CHATS, FIELDS as TEMPLATE_FIELDS, REMINDER, Template, TemplateError, field_values
+from utils.transfer import FIELDS, TransferError, detect_format
 
 router = Router()
 
@@ -17,22 +29,20 @@ load_dotenv()
 
 admin_ids_str = os.getenv("ADMIN_USER_IDS", "")
 ADMIN_IDS = set(map(int, admin_ids_str.split(','))) if admin_ids_str else set()
-WEEKDAY_SHORT_RU = {
-    "mon": "Пн",
-    "tue": "Вт",
-    "wed": "Ср",
-    "thu": "Чт",
-    "fri": "Пт",
-    "sat": "Сб",
-    "sun": "Вс"
-}
-EVENT_TYPE_RU = {
-    "weekly_once": "1 раз в неделю",
-    "weekly_multiple": "несколько дней в неделю",
-    "once": "одноразовый",
-    "weekday": "будничный"
-}
 DAY_ORDER = {'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6, 'sun': 7}
+GROUP_ORDER = ["Пн, Ср, Пт", "Вт, Чт", "Будни", "Сб", "Вс", "Все дни недели", "Прочее"]
+# Лимит Telegram — 4096 символов, оставляем запас под заголовок и подпись
+EVENTS_PAGE_LIMIT = 3500
+EVENTS_PER_PAGE = 15
+GROUP_END = "━━━━━━━━━━━━━━\n\n"
+EVENTS_CACHE_TTL = 60
+# Описание и правило в списке обрезаются: даже один длинный ивент не должен
+# превысить лимит страницы
+LIST_DESCRIPTION_LIMIT = 300
+LIST_RULE_LIMIT = 100
+# Через сколько секунд удаляются подтверждения («Ивент сохранён» и т.п.)
+CONFIRMATION_TTL = 5
+_events_pages_cache = {}
 DAY_GROUPS = {
     "Пн, Ср, Пт": {"mon", "wed", "fri"},
     "Вт, Чт": {"tue", "thu"},
@@ -42,28 +52,26 @@ DAY_GROUPS = {
     "Все дни недели": {"mon", "tue", "wed", "thu", "fri", "sat", "sun"},
 }
 
-def classify_days(days_str):
-    if not days_str:
-        return None
+# Маска дней недели -> группа списка ивентов
+DAY_GROUP_MASKS = {days_to_mask(",".join(group_days)): name for name, group_days in DAY_GROUPS.items()}
 
-    days = set(d.strip().lower() for d in days_str.split(",") if d.strip())
-    for name, group_days in DAY_GROUPS.items():
-        if days == group_days:
-            return name
-    return "Прочее"
+def classify_days(event):
+    if not event.days:
+        return None
+    return DAY_GROUP_MASKS.get(event.days_mask, "Прочее")
 
 def time_key(event):
-    try:
-        return datetime.strptime(event[4], "%H:%M")
-    except:
-        return datetime.strptime("00:00", "%H:%M")
+    return event.minute if event.minute is not None else 0
 
 def get_event_type_kb():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Еженедельные ивенты (несколько дней)", callback_data="weekly_multiple")],
         [InlineKeyboardButton(text="Еженедельный ивент (1 рза в неделю)", callback_data="weekly_once")],
         # [InlineKeyboardButton(text="Будничный ивент", callback_data="weekdays")],
-        [InlineKeyboardButton(text="Одноразовый ивент", callback_data="once")]
+        [InlineKeyboardButton(text="Одноразовый ивент", callback_data="once")],
+        [InlineKeyboardButton(text="Ежедневный ивент", callback_data="daily")],
+        [InlineKeyboardButton(text="Ежемесячный ивент", callback_data="monthly")],
+        [InlineKeyboardButton(text="Ивент по расписанию (cron)", callback_data="cron")]
     ])
 
 
@@ -88,6 +96,13 @@ def get_weekday_kb():
     ])
 
 
+def get_chats_kb(chats):
+    buttons = [[InlineKeyboardButton(text=title or str(chat_id), callback_data=f"target_chat:{chat_id}")]
+               for chat_id, title, *_ in chats]
+    buttons.append([InlineKeyboardButton(text="Во все чаты", callback_data="target_chat:all")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 def admin_only(handler):
     async def wrapper(message: Message, state: FSMContext, *args, **kwargs):
         if message.from_user.id not in ADMIN_IDS:
@@ -98,14 +113,6 @@ def admin_only(handler):
     return wrapper
 
 
-def convert_days_to_ru(days_str: str) -> str:
-    if not days_str:
-        return ""
-    days_list = days_str.split(",")
-    ru_days = [WEEKDAY_SHORT_RU.get(day, day) for day in days_list]
-    return ", ".join(ru_days)
-
-
 @router.message(Command("admin"))
 async def admin_panel(message: Message, state: FSMContext):
     if message.from_user.id not in ADMIN_IDS:
@@ -117,12 +124,12 @@ async def admin_panel(message: Message, state: FSMContext):
     # Текущее время сервера (UTC)
     utc_now = datetime.now(timezone.utc)
 
-    # Время по GMT+3
-    gmt3_now = utc_now.astimezone(timezone(timedelta(hours=3)))
+    # Время в поясе по умолчанию (с учётом перехода на летнее время, если он есть)
+    local_now = utc_now.astimezone(get_timezone(DEFAULT_TZ_NAME))
 
     # Форматируем строки
     server_time_str = utc_now.strftime("%Y-%m-%d %H:%M:%S UTC")
-    local_time_str = gmt3_now.strftime("%Y-%m-%d %H:%M:%S GMT+3")
+    local_time_str = local_now.strftime("%Y-%m-%d %H:%M:%S %Z")
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Создать ивент", callback_data="create_event")],
@@ -132,33 +139,242 @@ async def admin_panel(message: Message, state: FSMContext):
     await message.answer(
         f"📋 <b>Панель администратора</b>\n\n"
         f"🕒 <b>Время сервера (UTC):</b> {server_time_str}\n"
-        f"🕒 <b>Местное время (GMT+3):</b> {local_time_str}",
+        f"🕒 <b>Местное время ({DEFAULT_TZ_NAME}):</b> {local_time_str}",
         reply_markup=kb
     )
 
 
 @router.message(Command("getdb"))
-async def send_db_file(message: Message):
+async def send_db_file(message: Message, snapshots: SnapshotService):
     if message.from_user.id not in ADMIN_IDS:
         await message.answer("❌ У вас нет доступа.")
         return
 
+    # Отправляется согласованный снимок, а не живой файл; /getdb gz — сжатый
+    compress = "gz" in message.text.lower()
+    suffix = ".db.gz" if compress else ".db"
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
     try:
-        file = FSInputFile("events.db")
+        await snapshots.create(path, compress)
+        file = FSInputFile(path, filename=f"events-{datetime.now():%Y%m%d-%H%M}{suffix}")
         await message.answer_document(file, caption="📦 Файл базы данных")
     except Exception as e:
-        await message.answer(f"⚠️ Ошибка при отправке файла: {e}")
+        await message.answer(f"⚠️ Ошибка при отправке файла: {html.escape(str(e))}")
+    finally:
+        os.remove(path)
+
+
+@router.message(Command("export"))
+async def export_events_file(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ У вас нет доступа.")
+        return
+
+    # /export — JSONL, /export csv — CSV
+    fmt = "csv" if "csv" in message.text.lower() else "jsonl"
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        count = await export_events(path, fmt)
+        filename = f"events-{datetime.now():%Y%m%d-%H%M}.{fmt}"
+        await message.answer_document(FSInputFile(path, filename=filename), caption=f"📤 Ивентов: {count}")
+    except Exception as e:
+        await message.answer(f"⚠️ Ошибка при экспорте: {html.escape(str(e))}")
+    finally:
+        os.remove(path)
+
+
+@router.message(Command("import"))
+async def import_events_file(message: Message, scheduler: SchedulerBackend):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ У вас нет доступа.")
+        return
+
+    # Файл — во вложении с подписью /import или в сообщении, на которое ответили /import
+    document = message.document or (message.reply_to_message and message.reply_to_message.document)
+    if document is None:
+        await message.answer(
+            "📥 Отправьте файл .jsonl или .csv с подписью /import (или ответьте /import на файл).\n"
+            f"Поля: <code>{', '.join(FIELDS)}</code>"
+        )
+        return
+
+    fmt = detect_format(document.file_name)
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        await message.bot.download(document, destination=path)
+        count = await import_events(path, fmt, scheduler.default_chat_id)
+    except TransferError as e:
+        await message.answer("⚠️ Импорт отменён, ничего не сохранено:\n" + html.escape("\n".join(e.errors)))
+        return
+    except Exception as e:
+        await message.answer(f"⚠️ Ошибка при импорте: {html.escape(str(e))}")
+        return
+    finally:
+        os.remove(path)
+
+    scheduler.request_reload()
+    await message.answer(f"✅ Импортировано ивентов: {count}")
+
+
+@router.message(Command("addchat"))
+async def add_chat(message: Message, scheduler: SchedulerBackend):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ У вас нет доступа.")
+        return
+
+    # /addchat в группе регистрирует эту группу, /addchat <chat_id> — указанный чат
+    args = message.text.split()
+    try:
+        chat_id = int(args[1]) if len(args) > 1 else message.chat.id
+    except ValueError:
+        await message.answer("⚠️ Укажите ID чата: /addchat -100123456789")
+        return
+    title = message.chat.title if chat_id == message.chat.id else None
+    await upsert_chat(chat_id, title)
+    for chat in await get_chats():
+        if chat[0] == chat_id:
+            await scheduler.update_chat(*chat)
+    await message.answer(f"✅ Чат <code>{chat_id}</code> добавлен.")
+
+
+@router.message(Command("chats"))
+async def list_chats(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ У вас нет доступа.")
+        return
+
+    chats = await get_chats()
+    if not chats:
+        await message.answer("⚠️ Чаты не найдены.")
+        return
+    text = "💬 <b>Чаты:</b>\n\n"
+    for chat_id, title, tz_name, delete_after, locale in chats:
+        text += (
+            f"🆔 <code>{chat_id}</code> {html.escape(title or '', quote=False)}\n"
+            f"🌍 {tz_name} 🗑️ {delete_after} с 🗣️ {locale}\n"
+        )
+    text += "\nНастройка: /chatset ID tz Europe/Moscow, /chatset ID delete 600 или /chatset ID lang en"
+    await message.answer(text)
+
+
+@router.message(Command("chatset"))
+async def chat_settings(message: Message, scheduler: SchedulerBackend):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ У вас нет доступа.")
+        return
+
+    try:
+        _, chat_id, key, value = message.text.split(maxsplit=3)
+        chat_id = int(chat_id)
+        if key == "tz":
+            if get_timezone(value) is None:
+                raise ValueError(value)
+            await update_chat(chat_id, timezone=value)
+        elif key == "delete":
+            await update_chat(chat_id, delete_after=int(value))
+        elif key == "lang":
+            if value not in LOCALES:
+                raise ValueError(value)
+            await update_chat(chat_id, locale=value)
+        else:
+            raise ValueError(key)
+    except ValueError:
+        await message.answer("⚠️ Формат: /chatset ID tz Europe/Moscow, /chatset ID delete 600 "
+                             f"или /chatset ID lang {'|'.join(LOCALES)}")
+        return
+
+    for chat in await get_chats():
+        if chat[0] == chat_id:
+            await scheduler.update_chat(*chat)
+            await message.answer("✅ Настройки чата сохранены.")
+            return
+    await message.answer("⚠️ Чат не найден, сначала добавьте его: /addchat ID")
+
+
+@router.message(Command("template"))
+async def set_notification_template(message: Message, scheduler: SchedulerBackend):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ У вас нет доступа.")
+        return
+
+    # /template all|ID тип текст — задать шаблон, /template all|ID тип reset — сбросить
+    usage = (
+        "⚠️ Формат: /template all|ID тип текст или /template all|ID тип reset\n"
+        f"Типы: {', '.join([*(t.value for t in EventType), REMINDER])}\n"
+        f"Поля: {html.escape(', '.join('{' + field + '}' for field in TEMPLATE_FIELDS))}"
+    )
+    parts = message.text.split(maxsplit=3)
+    if len(parts) < 4:
+        current = "".join(
+            f"\n\n<b>{'все чаты' if chat_id == ALL_CHATS else chat_id} / {type_}</b>\n"
+            f"<code>{html.escape(source, quote=False)}</code>"
+            for chat_id, type_, source in await get_templates()
+        )
+        await message.answer(usage + (current or "\n\nСвоих шаблонов нет, используются стандартные."))
+        return
+    _, target, type_, source = parts
+    try:
+        chat_id = ALL_CHATS if target == "all" else int(target)
+        type_ = REMINDER if type_ == REMINDER else EventType(type_)
+    except ValueError:
+        await message.answer(usage)
+        return
+
+    if source.strip() == "reset":
+        await set_template(chat_id, str(type_), None)
+        scheduler.templates.set_template(chat_id, type_, None)
+        await message.answer("✅ Шаблон сброшен на стандартный.")
+        return
+
+    try:
+        template = Template(source)
+    except TemplateError as e:
+        await message.answer(f"⚠️ {html.escape(str(e), quote=False)}")
+        return
+    # Превью на примере ивента: заодно Telegram проверяет HTML-разметку шаблона
+    now = datetime.now()
+    offset = 15 if type_ == REMINDER else 0
+    sample = Event(0, EventType.WEEKLY if offset else type_, "mon,wed", now.strftime("%Y-%m-%d"), "10:00",
+                   "Пример <описания>", chat_id)
+    try:
+        await message.answer(template.render(field_values(sample, now, scheduler.templates.locale(chat_id), offset)))
+    except TelegramBadRequest as e:
+        await message.answer(f"⚠️ Telegram не принял шаблон: {html.escape(str(e), quote=False)}")
+        return
+    await set_template(chat_id, str(type_), source)
+    scheduler.templates.set_template(chat_id, type_, source)
+    await message.answer("✅ Шаблон сохранён, выше — пример уведомления.")
 
 
 @router.callback_query(F.data == "create_event")
 async def create_event(callback: CallbackQuery, state: FSMContext):
-    await state.set_state(EventCreation.choosing_type)
     await callback.answer()
+    chats = await get_chats()
+    if len(chats) > 1:
+        await state.set_state(EventCreation.choosing_chat)
+        await callback.message.answer("Выберите чат для ивента:", reply_markup=get_chats_kb(chats))
+        return
+    await state.set_state(EventCreation.choosing_type)
     await callback.message.answer("Выберите тип ивента:", reply_markup=get_event_type_kb())
 
 
+@router.callback_query(EventCreation.choosing_chat, F.data.startswith("target_chat:"))
+async def choose_chat(callback: CallbackQuery, state: FSMContext):
+    value = callback.data.split(":", 1)[1]
+    if value == "all":
+        chat_ids = [chat[0] for chat in await get_chats()]
+        await state.update_data(chat_id=chat_ids[0], targets=chat_ids)
+    else:
+        await state.update_data(chat_id=int(value), targets=[])
+    await state.set_state(EventCreation.choosing_type)
+    await callback.message.edit_text("Выберите тип ивента:", reply_markup=get_event_type_kb())
+
+
 # Шаг 1: Выбор типа ивента
-@router.callback_query(F.data.in_({"weekly_multiple", "weekly_once", "once", "weekdays"}))
+@router.callback_query(F.data.in_({"weekly_multiple", "weekly_once", "once", "weekdays", "daily", "monthly", "cron"}))
 async def choose_type(callback: CallbackQuery, state: FSMContext):
     await state.update_data(type=callback.data)
     if callback.data == "weekly_multiple":
@@ -170,6 +386,18 @@ async def choose_type(callback: CallbackQuery, state: FSMContext):
     elif callback.data == "once":
         await callback.message.edit_text("Введите дату ивента (в формате ГГГГ-ММ-ДД):")
         await state.set_state(EventCreation.entering_date)
+    elif callback.data == "monthly":
+        await callback.message.edit_text("Введите число месяца (1-31):")
+        await state.set_state(EventCreation.entering_month_day)
+    elif callback.data == "cron":
+        await callback.message.edit_text(
+            "Введите расписание в формате cron: <code>минуты часы день месяц день_недели</code>\n"
+            "Например, <code>0 19 * * mon-fri</code> или <code>*/30 10-18 * * 6</code>")
+        await state.set_state(EventCreation.entering_cron)
+    elif callback.data == "daily":
+        time_msg = await callback.message.answer("Введите время начала ивента (формат HH:MM):")
+        await state.update_data(time_prompt_id=time_msg.message_id)
+        await state.set_state(EventCreation.entering_time)
     elif callback.data == "weekdays":
         # Устанавливаем фиксированные будние дни
         await state.update_data(days="mon,tue,wed,thu,fri")
@@ -205,8 +433,49 @@ async def choose_multiple_days(callback: CallbackQuery, state: FSMContext):
     await state.set_state(EventCreation.entering_time)
 
 
+@router.message(EventCreation.entering_date)
+async def enter_date(message: Message, state: FSMContext):
+    try:
+        datetime.strptime(message.text.strip(), "%Y-%m-%d")
+    except ValueError:
+        await message.answer("⚠️ Неверный формат даты, нужно ГГГГ-ММ-ДД:")
+        return
+    await state.update_data(date=message.text.strip())
+    time_msg = await message.answer("Введите время начала ивента (формат HH:MM):")
+    await state.update_data(time_prompt_id=time_msg.message_id)
+    await state.set_state(EventCreation.entering_time)
+
+
+@router.message(EventCreation.entering_month_day)
+async def enter_month_day(message: Message, state: FSMContext):
+    day = message.text.strip()
+    if not day.isdigit() or not 1 <= int(day) <= 31:
+        await message.answer("⚠️ Введите число от 1 до 31:")
+        return
+    await state.update_data(rule=str(int(day)))
+    time_msg = await message.answer("Введите время начала ивента (формат HH:MM):")
+    await state.update_data(time_prompt_id=time_msg.message_id)
+    await state.set_state(EventCreation.entering_time)
+
+
+@router.message(EventCreation.entering_cron)
+async def enter_cron(message: Message, state: FSMContext):
+    expression = " ".join(message.text.split())
+    if compile_rule("cron", None, None, None, rule=expression) is None:
+        await message.answer("⚠️ Не удалось разобрать расписание, попробуйте ещё раз:")
+        return
+    # Время срабатывания задаётся самим выражением
+    await state.update_data(rule=expression)
+    next_msg = await message.answer("Введите описание ивента:")
+    await state.update_data(description_prompt_id=next_msg.message_id)
+    await state.set_state(EventCreation.entering_description)
+
+
 @router.message(EventCreation.entering_time)
 async def enter_time(message: Message, state: FSMContext):
+    if parse_time(message.text) is None:
+        await message.answer("⚠️ Неверный формат времени, нужно HH:MM:")
+        return
     data = await state.get_data()
     await state.update_data(time=message.text)
 
@@ -229,96 +498,160 @@ async def enter_time(message: Message, state: FSMContext):
 
 
 @router.message(EventCreation.entering_description)
-async def enter_description(message: Message, state: FSMContext):
+async def enter_description(message: Message, state: FSMContext, scheduler: SchedulerBackend,
+                            deleter: DeletionService):
     await state.update_data(description=message.text)
     data = await state.get_data()
 
     # Удаление сообщений
-    try:
-        await message.delete()
-    except Exception:
-        pass
-
-    if "description_prompt_id" in data:
-        try:
-            await message.bot.delete_message(chat_id=message.chat.id, message_id=data["description_prompt_id"])
-        except Exception:
-            pass
+    await deleter.schedule_many(message.chat.id,
+                                [message.message_id, *filter(None, [data.get("description_prompt_id")])])
     if data.get("type") == "weekly_once" and not data.get("days"):
         data["days"] = data.get("day")  # day='mon', например
     # Сохранение события в БД
-    add_event(
+    event_id = await add_event(
         event_type=data.get("type"),
         days=data.get("days"),
         date=data.get("date"),
         time=data.get("time"),
-        description=data.get("description")
+        description=data.get("description"),
+        chat_id=data.get("chat_id") or scheduler.default_chat_id,
+        targets=data.get("targets"),
+        rule=data.get("rule")
     )
+    scheduler.add_event(await get_event(event_id), data.get("targets") or ())
 
     msg = await message.answer("✅ Ивент сохранён.")
-    await sleep(5)
-    try:
-        await msg.delete()
-    except Exception:
-        pass
+    await deleter.schedule(msg.chat.id, msg.message_id, delay=CONFIRMATION_TTL)
     await state.clear()
 
 
-@router.callback_query(F.data == "list_events")
-async def list_events(callback: CallbackQuery):
-    events = get_all_events()
-    if not events:
-        await callback.message.edit_text("⚠️ Ивенты не найдены.", reply_markup=InlineKeyboardMarkup(
-            inline_keyboard=[[InlineKeyboardButton(text="Назад", callback_data="hide_list")]]
-        ))
-        return
+def shorten(text, limit):
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def render_event_entry(e):
+    ru_type = type_name(e.type)
+    time = e.time
+    if e.type == EventType.DAILY:
+        days_display = "Каждый день"
+    elif e.type == EventType.MONTHLY:
+        days_display = f"{e.rule} числа"
+    elif e.type == EventType.CRON:
+        days_display, time = "cron", html.escape(shorten(e.rule or "", LIST_RULE_LIMIT), quote=False)
+    else:
+        days_display = format_days(e.days) if e.days else e.date
+    reminders = f"🔔 за {', '.join(format_minutes(offset) for offset in e.reminders)}\n" if e.reminders else ""
+    return (
+        "━━━━━━━━━━━━━━\n"
+        f"🆔 <b>{e.id}</b> | <i>{ru_type}</i>\n"
+        f"📅 <b>{days_display}</b> ⏰ <b>{time}</b>\n"
+        f"📝 <i>{html.escape(shorten(e.description or '', LIST_DESCRIPTION_LIMIT), quote=False)}</i>\n"
+        f"{reminders}"
+    )
 
-    # Группировка
-    grouped = {
-        "Пн, Ср, Пт": [],
-        "Вт, Чт": [],
-        "Будни": [],
-        "Сб": [],
-        "Вс": [],
-        "Все дни недели": [],
-        "Прочее": []
-    }
 
+def build_events_pages(events, group_filter):
+    # Группировка
+    grouped = {name: [] for name in GROUP_ORDER}
     for e in events:
-        _, type_, days, date, time, description = e
-        group_name = classify_days(days)
-        grouped[group_name].append(e)
+        grouped[classify_days(e) or "Прочее"].append(e)
 
-    # Формируем текст
-    text = "📋 <b>Ивенты:</b>\n\n"
-    for group_name in ["Пн, Ср, Пт", "Вт, Чт", "Будни", "Сб", "Вс", "Все дни недели", "Прочее"]:
+    groups = GROUP_ORDER if group_filter is None else [GROUP_ORDER[group_filter]]
+    pages = []
+    text, count = "", 0
+    for group_name in groups:
         events_in_group = sorted(grouped[group_name], key=time_key)
         if not events_in_group:
             continue
-        text += f"🔹 <b>{group_name}</b>\n"
+        header = f"🔹 <b>{group_name}</b>\n"
+        started = False  # заголовок группы уже на текущей странице
         for e in events_in_group:
-            event_id = e[0]
-            event_type = e[1]
-            days = e[2]
-            date = e[3]
-            time = e[4]
-            description = e[5]
-
-            ru_type = EVENT_TYPE_RU.get(event_type, event_type)
-            days_display = convert_days_to_ru(days) if days else date
-
-            text += (
-                "━━━━━━━━━━━━━━\n"
-                f"🆔 <b>{event_id}</b> | <i>{ru_type}</i>\n"
-                f"📅 <b>{days_display}</b> ⏰ <b>{time}</b>\n"
-                f"📝 <i>{description}</i>\n"
-            )
-        text += "━━━━━━━━━━━━━━\n\n"
-
-    text += "Чтобы удалить: /delete ID"
-    await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="Скрыть", callback_data="hide_list")]]
-    ))
+            # Заголовок попадает на страницу только вместе с ивентом группы
+            entry = render_event_entry(e) if started else header + render_event_entry(e)
+            # Новая страница, если не влезает в лимит символов или ивентов
+            # (с учётом разделителя, закрывающего страницу)
+            if count and (count >= EVENTS_PER_PAGE or len(text) + len(entry) + len(GROUP_END) > EVENTS_PAGE_LIMIT):
+                # Страница на границе групп уже закрыта разделителем
+                pages.append(text + "━━━━━━━━━━━━━━\n" if started else text)
+                text, count = "", 0
+                if started:
+                    entry = header + entry  # продолжение группы — снова с заголовком
+            text += entry
+            count += 1
+            started = True
+        text += GROUP_END
+    if count:
+        pages.append(text)
+    return pages
+
+
+async def get_events_pages(group_filter):
+    # Страницы кэшируются до изменения ивентов (add_event/delete_event)
+    version = events_version()
+    cached = _events_pages_cache.get(group_filter)
+    if cached and cached[0] == version and time.monotonic() - cached[1] < EVENTS_CACHE_TTL:
+        return cached[2]
+    if version != _events_pages_cache.get("version"):
+        _events_pages_cache.clear()
+        _events_pages_cache["version"] = version
+    pages = build_events_pages(await get_all_events(), group_filter)
+    _events_pages_cache[group_filter] = (version, time.monotonic(), pages)
+    return pages
+
+
+def get_events_page_kb(group_filter, page, total):
+    group_key = "all" if group_filter is None else group_filter
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"events:{group_key}:{page - 1}"))
+    if total > 1:
+        nav.append(InlineKeyboardButton(text=f"{page + 1}/{total}", callback_data="events_noop"))
+    if page < total - 1:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"events:{group_key}:{page + 1}"))
+
+    filters = [InlineKeyboardButton(text=("• " if group_filter is None else "") + "Все", callback_data="events:all:0")]
+    filters += [
+        InlineKeyboardButton(text=("• " if group_filter == index else "") + name, callback_data=f"events:{index}:0")
+        for index, name in enumerate(GROUP_ORDER)
+    ]
+    rows = [nav] if nav else []
+    rows += [filters[i:i + 4] for i in range(0, len(filters), 4)]
+    rows.append([InlineKeyboardButton(text="Скрыть", callback_data="hide_list")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+async def show_events_page(callback: CallbackQuery, group_filter, page):
+    pages = await get_events_pages(group_filter)
+    if pages:
+        page = min(max(page, 0), len(pages) - 1)
+        text = "📋 <b>Ивенты:</b>\n\n" + pages[page] + "Чтобы удалить: /delete ID"
+    else:
+        page, text = 0, "⚠️ Ивенты не найдены."
+    try:
+        await callback.message.edit_text(text, reply_markup=get_events_page_kb(group_filter, page, len(pages)))
+    except TelegramBadRequest as e:
+        # Повторное нажатие на текущую страницу; остальные ошибки не глотаем
+        if "message is not modified" not in e.message:
+            raise
+
+
+@router.callback_query(F.data == "list_events")
+async def list_events(callback: CallbackQuery):
+    await show_events_page(callback, None, 0)
+
+
+@router.callback_query(F.data.startswith("events:"))
+async def list_events_page(callback: CallbackQuery):
+    _, group_key, page = callback.data.split(":")
+    group_filter = None if group_key == "all" else int(group_key)
+    await show_events_page(callback, group_filter, int(page))
+    await callback.answer()
+
+
+@router.callback_query(F.data == "events_noop")
+async def events_noop(callback: CallbackQuery):
+    await callback.answer()
 
 
 @router.callback_query(F.data == "hide_list")
@@ -331,16 +664,45 @@ async def hide_list(callback: CallbackQuery):
 
 
 @router.message(Command("delete"))
-async def delete_by_id(message: Message):
+async def delete_by_id(message: Message, scheduler: SchedulerBackend, deleter: DeletionService):
     try:
         event_id = int(message.text.split()[1])
-        delete_event(event_id)
+        await delete_event(event_id)
+        scheduler.remove_event(event_id)
         sent_msg = await message.answer("🗑️ Ивент удалён.")
-        await sleep(5)
 
-        # Удаляем сообщение пользователя (с вводом описания)
-        await message.delete()
-        # Удаляем сообщение бота с подтверждением
-        await sent_msg.delete()
+        # Команду и подтверждение удалит DeletionService одной пачкой
+        await deleter.schedule_many(message.chat.id, [message.message_id, sent_msg.message_id],
+                                    delay=CONFIRMATION_TTL)
     except:
         await message.answer("⚠️ Укажите ID: /delete 1")
+
+
+@router.message(Command("remind"))
+async def set_event_reminders(message: Message, scheduler: SchedulerBackend):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ У вас нет доступа.")
+        return
+
+    # /remind ID 15,60 — напоминать за 15 минут и за час, /remind ID off — без напоминаний
+    usage = "⚠️ Формат: /remind ID 15,60 (минуты до ивента) или /remind ID off"
+    parts = message.text.split(maxsplit=2)
+    if len(parts) < 3:
+        await message.answer(usage)
+        return
+    try:
+        event_id = int(parts[1])
+        reminders = () if parts[2].strip() == "off" else parse_reminders(parts[2])
+    except ValueError as e:
+        await message.answer(f"{usage}\n{html.escape(str(e), quote=False)}")
+        return
+
+    event = await set_reminders(event_id, reminders)
+    if event is None:
+        await message.answer("⚠️ Ивент не найден.")
+        return
+    scheduler.update_event(event)
+    if reminders:
+        await message.answer(f"🔔 Напоминания за {', '.join(format_minutes(offset) for offset in reminders)}.")
+    else:
+        await message.answer("🔕 Напоминания отключены.")
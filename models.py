@@ -0,0 +1,69 @@
+from enum import Enum
+
+from utils.recurrence import build_rule, date_to_ordinal, days_to_mask, parse_reminders, time_to_minute
+
+
+class EventType(str, Enum):
+    ONCE = "once"
+    WEEKLY = "weekly"
+    WEEKLY_ONCE = "weekly_once"
+    WEEKLY_MULTIPLE = "weekly_multiple"
+    DAILY = "daily"
+    MONTHLY = "monthly"
+    CRON = "cron"
+
+    def __str__(self):
+        return self.value
+
+    @classmethod
+    def parse(cls, value):
+        # Неизвестный тип (старые записи) остаётся строкой
+        try:
+            return cls(value)
+        except ValueError:
+            return value
+
+
+class Event:
+    """Ивент из БД.
+
+    Поля расписания разбираются один раз при чтении строки, правило повторения
+    строится из них без повторного разбора: days_mask — дни недели из days (бит 0 —
+    понедельник, как колонка days_mask в БД), minute — минута суток, date_ordinal —
+    дата разового ивента, reminders — за сколько минут до срабатывания прислать
+    напоминания (по возрастанию). Объекты не изменяются после создания: их
+    разделяют кэш ивентов, планировщик и админка.
+    """
+
+    __slots__ = ("id", "type", "days", "date", "time", "description", "chat_id", "rule",
+                 "reminders", "days_mask", "minute", "date_ordinal")
+
+    def __init__(self, id, type, days, date, time, description, chat_id, rule=None, reminders=None):
+        self.id = id
+        self.type = EventType.parse(type)
+        self.days = days
+        self.date = date
+        self.time = time
+        self.description = description
+        self.chat_id = chat_id
+        self.rule = rule
+        self.reminders = parse_reminders(reminders)
+        self.days_mask = days_to_mask(days)
+        self.minute = time_to_minute(time) if time else None
+        self.date_ordinal = date_to_ordinal(date)
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        # row_factory для запросов SELECT {EVENT_COLUMNS}
+        return cls(*row)
+
+    def compile(self, tz):
+        return build_rule(self.type, self.days_mask, self.minute, self.date_ordinal, self.rule, tz)
+
+    @property
+    def offsets(self):
+        # Уведомления ивента в минутах до срабатывания: само срабатывание и напоминания
+        return (0, *self.reminders)
+
+    def __repr__(self):
+        return f"Event(id={self.id}, type={self.type}, days={self.days!r}, date={self.date!r}, time={self.time!r})"
@@ -1,10 +1,13 @@
 from aiogram.fsm.state import StatesGroup, State
 
 class EventCreation(StatesGroup):
+    choosing_chat = State()           # если зарегистрировано несколько чатов
     choosing_type = State()
     choosing_days = State()           # для weekly_multiple
     choosing_day_once = State()       # для weekly_once (один день)
     entering_date = State()           # для once
+    entering_month_day = State()      # для monthly
+    entering_cron = State()           # для cron
     entering_time = State()
     entering_description = State()
 
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from utils.recurrence import CronRule, DailyRule, MonthlyRule, next_notification
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+
+def local(*args):
+    return datetime(*args, tzinfo=BERLIN)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def as_utc(moment):
+    # Время в одном поясе сравнивается и вычитается по стенным часам (без учёта
+    # перевода часов и fold), поэтому проверяем абсолютные моменты
+    return moment.astimezone(timezone.utc)
+
+
+def fires(rule, start, end):
+    # Все срабатывания правила в [start, end)
+    result = []
+    fire_at = rule.next_after(start)
+    while fire_at is not None and fire_at < end:
+        result.append(fire_at)
+        fire_at = rule.next_after(fire_at + timedelta(minutes=1))
+    return result
+
+
+def test_daily_in_spring_forward_gap_shifts_by_transition():
+    # 29.03.2026 в Берлине часы переводят с 02:00 на 03:00: 02:30 не существует
+    rule = DailyRule(2 * 60 + 30, BERLIN)
+    fire_at = rule.next_after(local(2026, 3, 29, 0, 0))
+    assert as_utc(fire_at) == utc(2026, 3, 29, 1, 30)
+    assert (fire_at.hour, fire_at.minute) == (3, 30)
+    # На следующий день — снова 02:30
+    assert as_utc(rule.next_after(fire_at + timedelta(minutes=1))) == utc(2026, 3, 30, 0, 30)
+
+
+def test_cron_fires_once_across_fall_back():
+    # 25.10.2026 в Берлине 02:00–03:00 проходит дважды
+    rule = CronRule("30 2 * * *", BERLIN)
+    result = fires(rule, local(2026, 10, 24, 12, 0), local(2026, 10, 27, 0, 0))
+    # Первый вариант неоднозначного времени — летнее время (UTC+2), дальше зимнее
+    assert [as_utc(fire_at) for fire_at in result] == [utc(2026, 10, 25, 0, 30), utc(2026, 10, 26, 1, 30)]
+
+
+def test_cron_after_second_occurrence_of_ambiguous_hour_waits_for_next_day():
+    rule = CronRule("30 2 * * *", BERLIN)
+    # 02:00 по зимнему времени (второй проход часа): 02:30 уже было
+    assert as_utc(rule.next_after(utc(2026, 10, 25, 1, 0))) == utc(2026, 10, 26, 1, 30)
+
+
+def test_monthly_on_31st_skips_short_months():
+    rule = MonthlyRule(31, 9 * 60, BERLIN)
+    result = fires(rule, local(2026, 1, 1), local(2027, 1, 1))
+    assert [fire_at.month for fire_at in result] == [1, 3, 5, 7, 8, 10, 12]
+    assert all(fire_at.day == 31 and fire_at.hour == 9 for fire_at in result)
+
+
+def test_monthly_on_30th_skips_february():
+    rule = MonthlyRule(30, 9 * 60, BERLIN)
+    assert rule.next_after(local(2026, 1, 30, 9, 1)) == local(2026, 3, 30, 9, 0)
+
+
+def test_reminder_offset_across_spring_forward_is_absolute():
+    # Срабатывание 29.03.2026 в 09:00 (летнее время), напоминание за 10 часов:
+    # по местным часам это 22:00 накануне, ещё по зимнему времени
+    rule = DailyRule(9 * 60, BERLIN)
+    notify_at, fire_at = next_notification(rule, local(2026, 3, 28, 12, 0), offset=600)
+    assert as_utc(fire_at) == utc(2026, 3, 29, 7, 0)
+    assert as_utc(notify_at) == utc(2026, 3, 28, 21, 0)
+    assert (notify_at.day, notify_at.hour) == (28, 22)
+
+
+def test_reminder_offset_across_fall_back_is_absolute():
+    rule = DailyRule(9 * 60, BERLIN)
+    notify_at, fire_at = next_notification(rule, local(2026, 10, 24, 12, 0), offset=600)
+    # 09:00 по зимнему времени, напоминание — в 00:00 по летнему
+    assert as_utc(fire_at) == utc(2026, 10, 25, 8, 0)
+    assert as_utc(notify_at) == utc(2026, 10, 24, 22, 0)
+    assert (notify_at.day, notify_at.hour) == (25, 0)
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.base import BaseTrigger
+
+import database
+from database import claim_occurrences, get_all_events, get_chats, get_event_targets, get_templates, set_next_fire_at
+from utils.metrics import EVENTS_SCHEDULED, EVENTS_SKIPPED, LAST_TICK, TICK_SECONDS
+from utils.i18n import DEFAULT_LOCALE
+from utils.recurrence import compile_rule, next_notification
+from utils.scheduler import CLAIM_RETRY_DELAY, SchedulerBackend
+
+logger = logging.getLogger(__name__)
+
+JOB_PREFIX = "event:"
+JOBS_TABLE = "apscheduler_jobs"
+
+# Задачи в хранилище ссылаются на fire_event по имени модуля, поэтому
+# работающий планировщик регистрируется здесь при запуске
+_backend = None
+
+
+async def fire_event(event_id, offset=0):
+    if _backend is not None:
+        await _backend._fire(event_id, offset)
+
+
+class RuleTrigger(BaseTrigger):
+    """Триггер APScheduler поверх правил utils.recurrence.
+
+    В хранилище сохраняются только параметры ивента, правило компилируется заново
+    после загрузки задачи. offset > 0 — задача напоминания за offset минут до
+    срабатывания.
+    """
+
+    __slots__ = ("args", "_compiled")
+
+    def __init__(self, type_, days, date, time_, tz, rule=None, offset=0):
+        self.args = (type_, days, date, time_, tz, rule, offset)
+        self._compiled = None
+
+    @property
+    def rule(self):
+        if self._compiled is None:
+            self._compiled = compile_rule(*self.args[:6])
+        return self._compiled
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        if self.rule is None:
+            return None
+        after = previous_fire_time + timedelta(minutes=1) if previous_fire_time is not None else now
+        item = next_notification(self.rule, after, self.args[6])
+        return item[0] if item else None
+
+    def __getstate__(self):
+        return {"version": 1, "args": self.args}
+
+    def __setstate__(self, state):
+        # Задачи, сохранённые до появления напоминаний, — без offset
+        self.args = (*state["args"], 0)[:7]
+        self._compiled = None
+
+    def __str__(self):
+        return f"rule{self.args}"
+
+
+def _job_id(event_id, offset=0):
+    return f"{JOB_PREFIX}{event_id}:{offset}" if offset else f"{JOB_PREFIX}{event_id}"
+
+
+class APSchedulerBackend(SchedulerBackend):
+    """Планировщик на APScheduler: у каждого ивента своя задача в SQLite.
+
+    Задачи хранятся в той же БД и переживают перезапуск. Срабатывание, пропущенное
+    за время простоя, выполняется, если опоздание не больше max_lateness
+    (misfire_grace_time); несколько пропущенных срабатываний сливаются в одно.
+    Каждое напоминание ивента — отдельная задача со смещением.
+
+    Запись задач в хранилище — синхронный SQL, поэтому add_job/remove_job идут
+    в отдельном потоке, по одной, в порядке вызовов: цикл событий не ждёт БД.
+    """
+
+    def __init__(self, *args, jobstore_url=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reload = asyncio.Event()
+        self.scheduler = AsyncIOScheduler(
+            jobstores={"default": SQLAlchemyJobStore(url=jobstore_url or f"sqlite:///{database.DB_PATH}",
+                                                     tablename=JOBS_TABLE)},
+            job_defaults={"coalesce": True, "max_instances": 1,
+                          "misfire_grace_time": int(self.max_lateness.total_seconds())})
+        self._jobstore_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobstore")
+
+    def add_event(self, event, targets=()):
+        self._targets[event.id] = set(targets) - {event.chat_id}
+        previous = self._events.get(event.id)
+        self._events[event.id] = event
+        self._rules.pop(event.id, None)
+        # Пока планировщик не запущен (реплика не лидер), задачи сверит лидер
+        if self.scheduler.running:
+            removed = set(previous.offsets) - set(event.offsets) if previous is not None else ()
+            self._in_background(self._reschedule, event, removed)
+
+    def remove_event(self, event_id):
+        event = self._events.pop(event_id, None)
+        self._rules.pop(event_id, None)
+        self._targets.pop(event_id, None)
+        if self.scheduler.running:
+            self._in_background(self._unschedule, event_id, event.offsets if event else (0,))
+
+    async def update_chat(self, chat_id, title, timezone, delete_after, locale=DEFAULT_LOCALE):
+        # Новый часовой пояс — пересоздаём задачи ивентов этого чата
+        self._set_chat(chat_id, title, timezone, delete_after, locale)
+        events = [e for e in self._events.values() if e.chat_id == chat_id]
+        rearmed = []
+        for event in events:
+            self._rules.pop(event.id, None)
+            next_fire = self._next_notify_at(event, self.clock.minute_start())
+            rearmed.append((int(next_fire.timestamp()) if next_fire else None, event.id))
+        if events and self.scheduler.running:
+            await self._in_jobstore(self._schedule_all, events)
+        if rearmed:
+            await set_next_fire_at(rearmed)
+
+    def request_reload(self):
+        # Ивенты изменились в обход этого процесса (другая реплика) — перечитаем БД
+        self._reload.set()
+
+    def _next_notify_at(self, event, after):
+        # Ближайшее уведомление ивента (срабатывание или напоминание) для next_fire_at
+        rule = self._rule(event)
+        items = [next_notification(rule, after, offset) for offset in event.offsets] if rule else []
+        return min((item[0] for item in items if item), default=None)
+
+    def _trigger(self, event, offset=0):
+        # Тип сохраняется строкой, чтобы задачи в хранилище не зависели от models
+        return RuleTrigger(str(event.type), event.days, event.date, event.time, self._chat_tz(event.chat_id),
+                           event.rule, offset)
+
+    def _in_jobstore(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._jobstore_executor, fn, *args)
+
+    def _in_background(self, fn, *args):
+        # Хендлеру не нужно ждать записи задач; ошибку только логируем
+        self._in_jobstore(fn, *args).add_done_callback(self._log_jobstore_error)
+
+    @staticmethod
+    def _log_jobstore_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"❌ Ошибка при записи задач APScheduler: {future.exception()}")
+
+    # Дальше — методы потока хранилища задач
+
+    def _reschedule(self, event, removed_offsets=()):
+        self._unschedule(event.id, removed_offsets)
+        self._schedule(event)
+
+    def _schedule_all(self, events):
+        for event in events:
+            self._schedule(event)
+
+    def _schedule(self, event, offsets=None):
+        for offset in event.offsets if offsets is None else offsets:
+            trigger = self._trigger(event, offset)
+            if trigger.rule is None or trigger.get_next_fire_time(None, self.clock.now()) is None:
+                self._unschedule(event.id, (offset,))
+                continue
+            self.scheduler.add_job(fire_event, trigger, args=(event.id, offset) if offset else (event.id,),
+                                   id=_job_id(event.id, offset), name=(event.description or "")[:64],
+                                   replace_existing=True)
+
+    def _unschedule(self, event_id, offsets):
+        for offset in offsets:
+            try:
+                self.scheduler.remove_job(_job_id(event_id, offset))
+            except JobLookupError:
+                pass
+
+    def _sync_jobs(self, events):
+        # Сверка задач с таблицей events: недостающие добавляются, лишние удаляются,
+        # задачи с изменёнными параметрами пересоздаются. Время следующего запуска
+        # у совпадающих задач сохраняется, чтобы не потерять пропущенные срабатывания.
+        # events — копия self._events: её не меняют хендлеры, пока идёт сверка
+        jobs = {job.id: job for job in self.scheduler.get_jobs()}
+        for event_id, event in events.items():
+            for offset in event.offsets:
+                job = jobs.pop(_job_id(event_id, offset), None)
+                if job is None or job.trigger.args != self._trigger(event, offset).args:
+                    self._schedule(event, (offset,))
+        for job_id in jobs:
+            if job_id.startswith(JOB_PREFIX):
+                self.scheduler.remove_job(job_id)
+
+    async def _load_from_db(self):
+        try:
+            events = await get_all_events()
+            self._load_chats(await get_chats(), await get_event_targets(), await get_templates())
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении ивентов из БД: {e}")
+            return False
+        self._events = {event.id: event for event in events}
+        self._rules.clear()
+        EVENTS_SCHEDULED.set(len(self._events))
+        return True
+
+    def _last_occurrence(self, rule, now, offset=0):
+        # Уведомление, ради которого запущена задача: последнее в окне опоздания
+        last = None
+        item = next_notification(rule, now - self.max_lateness - timedelta(minutes=1), offset)
+        while item is not None and item[0] <= now:
+            last = item[0]
+            item = next_notification(rule, last + timedelta(minutes=1), offset)
+        return last
+
+    async def _fire(self, event_id, offset=0):
+        LAST_TICK.set(time.time())
+        with TICK_SECONDS.time():
+            await self._fire_event(event_id, offset)
+
+    async def _fire_event(self, event_id, offset=0):
+        event = self._events.get(event_id)
+        rule = self._rule(event) if event else None
+        if rule is None or offset not in event.offsets:
+            return
+        fire_at = self._last_occurrence(rule, self.clock.now(), offset)
+        if fire_at is None:
+            return
+        # Атомарный захват срабатывания вместе с журналом доставок:
+        # при смене лидера или падении уведомление не уйдёт дважды и не потеряется
+        next_fire = self._next_notify_at(event, fire_at + timedelta(minutes=1))
+        item = (event_id, int(fire_at.timestamp()), int(next_fire.timestamp()) if next_fire else None)
+        deliveries = self._deliveries(fire_at, event, offset)
+        claimed = await self._claim(item, {item[:2]: deliveries}, fire_at)
+        if item[:2] not in claimed:
+            EVENTS_SKIPPED.inc(reason="claimed")
+            return  # уже отправлено другой репликой
+        if deliveries:
+            self._send(fire_at, event_id, deliveries)
+
+    async def _claim(self, item, deliveries, fire_at):
+        # Незахваченное уведомление не отправляется: при ошибке БД повторяем,
+        # пока срабатывание не опоздало больше max_lateness
+        while True:
+            try:
+                return await claim_occurrences([item], self.replica_id, deliveries)
+            except Exception as e:
+                if self.clock.now() + CLAIM_RETRY_DELAY - fire_at > self.max_lateness:
+                    logger.error(f"❌ Ошибка при захвате срабатываний, уведомление пропущено: {e}")
+                    return set()
+                logger.error(f"❌ Ошибка при захвате срабатываний, повтор через {CLAIM_RETRY_DELAY.seconds} с: {e}")
+                await asyncio.sleep(CLAIM_RETRY_DELAY.total_seconds())
+
+    async def run(self):
+        global _backend
+        await self._initial_load()
+        await self._resume_deliveries()
+        _backend = self
+        self.scheduler.start()
+        try:
+            await self._in_jobstore(self._sync_jobs, dict(self._events))
+            while True:
+                await self._reload.wait()
+                self._reload.clear()
+                # При ошибке задачи не сверяем: в памяти остаются прежние ивенты
+                if await self._load_from_db():
+                    await self._in_jobstore(self._sync_jobs, dict(self._events))
+        finally:
+            self.scheduler.shutdown(wait=False)
+            _backend = None
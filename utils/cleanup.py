@@ -1,7 +1,122 @@
-async def clear_chat(state, bot, chat_id, messages: list):
-    for msg_id in messages:
-        try:
-            await bot.delete_message(chat_id, msg_id)
-        except:
-            pass
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramNotFound
+
+from database import add_pending_deletions, get_due_deletions, get_next_deletion_at, remove_pending_deletions
+from utils.clock import MinuteClock
+
+logger = logging.getLogger(__name__)
+
+# deleteMessages принимает не больше 100 id за раз
+BULK_DELETE_LIMIT = 100
+BATCH_SIZE = 500
+# Отсрочка удаления в чате после ошибки Telegram/сети: удваивается до RETRY_MAX_DELAY
+RETRY_DELAY = 30
+RETRY_MAX_DELAY = 3600
+
+
+async def clear_chat(state, deleter, chat_id, messages: list):
+    # Сообщения удалит DeletionService одной пачкой, хендлер не ждёт
+    await deleter.schedule_many(chat_id, messages)
     await state.clear()
+
+
+class DeletionService:
+    """Отложенное удаление сообщений.
+
+    Очередь хранится в таблице pending_deletions, поэтому переживает перезапуск.
+    Один цикл спит до ближайшего delete_at и удаляет созревшие сообщения пачками.
+    Удалённые пачки сразу убираются из очереди; если чат недоступен временно,
+    его сообщения откладываются, остальные чаты продолжают удаляться.
+    """
+
+    def __init__(self, bot, clock=None):
+        self.bot = bot
+        self.clock = clock or MinuteClock()
+        self._wakeup = asyncio.Event()
+        self._failures = defaultdict(int)  # chat_id -> ошибок подряд
+
+    async def schedule(self, chat_id, message_id, delay):
+        await self.schedule_many(chat_id, [message_id], delay)
+
+    async def schedule_many(self, chat_id, message_ids, delay=0):
+        delete_at = int(time.time() + delay)
+        await add_pending_deletions([(chat_id, message_id, delete_at) for message_id in message_ids])
+        self.wake()
+
+    def wake(self):
+        # Перечитать ближайший delete_at (очередь могла пополниться другой репликой)
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                next_at = await get_next_deletion_at()
+            except Exception as e:
+                logger.error(f"❌ Ошибка при чтении очереди удаления: {e}")
+                next_at = time.time() + 60
+            deadline = datetime.fromtimestamp(next_at, timezone.utc) if next_at is not None else None
+            await self.clock.sleep_until(deadline, self._wakeup)
+            try:
+                await self.drain()
+            except Exception as e:
+                logger.error(f"❌ Ошибка при удалении сообщений: {e}")
+                await asyncio.sleep(5)
+
+    async def drain(self):
+        while True:
+            due = await get_due_deletions(int(time.time()), BATCH_SIZE)
+            if not due:
+                return
+            by_chat = defaultdict(list)
+            for chat_id, message_id in due:
+                by_chat[chat_id].append(message_id)
+
+            for chat_id, message_ids in by_chat.items():
+                await self._drain_chat(chat_id, message_ids)
+
+    async def _drain_chat(self, chat_id, message_ids):
+        for i in range(0, len(message_ids), BULK_DELETE_LIMIT):
+            chunk = message_ids[i:i + BULK_DELETE_LIMIT]
+            try:
+                await self._delete_chunk(chat_id, chunk)
+            except (TelegramForbiddenError, TelegramNotFound) as e:
+                # Бота убрали из чата или чата больше нет — удалять нечего
+                logger.warning(f"⚠️ Чат {chat_id} недоступен, сообщения убраны из очереди: {e}")
+                self._failures.pop(chat_id, None)
+                await remove_pending_deletions([(chat_id, message_id) for message_id in message_ids[i:]])
+                return
+            except TelegramAPIError as e:
+                # 5xx, сеть, RetryAfter: остаток сообщений чата откладывается с нарастающей
+                # паузой, чтобы не повторять его в каждом проходе
+                self._failures[chat_id] += 1
+                delay = getattr(e, "retry_after", None) or min(
+                    RETRY_DELAY * 2 ** (self._failures[chat_id] - 1), RETRY_MAX_DELAY)
+                logger.warning(f"⚠️ Не удалось удалить сообщения в {chat_id}, повтор через {delay} с: {e}")
+                delete_at = int(time.time() + delay)
+                await add_pending_deletions([(chat_id, message_id, delete_at) for message_id in message_ids[i:]])
+                return
+            self._failures.pop(chat_id, None)
+            await remove_pending_deletions([(chat_id, message_id) for message_id in chunk])
+
+    async def _delete_chunk(self, chat_id, message_ids):
+        try:
+            await self.bot.delete_messages(chat_id, message_ids)
+            logger.info(f"🗑️ Удалено сообщений в {chat_id}: {len(message_ids)}",
+                        extra={"chat_id": chat_id, "count": len(message_ids)})
+            return
+        except TelegramBadRequest as e:
+            if len(message_ids) == 1:
+                logger.warning(f"⚠️ Не удалось удалить сообщение {message_ids[0]}: {e}")
+                return
+        # Пачку целиком удалить не вышло — удаляем по одному
+        for message_id in message_ids:
+            try:
+                await self.bot.delete_message(chat_id, message_id)
+            except TelegramBadRequest as e:
+                logger.warning(f"⚠️ Не удалось удалить сообщение {message_id}: {e}")
@@ -0,0 +1,50 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from utils.recurrence import LOCAL_TZ
+
+# Максимальный кусок сна: после него сверяемся со стенными часами
+# (перевод часов, засыпание процесса/хоста)
+MAX_SLEEP_CHUNK = 30
+
+
+class MinuteClock:
+    """Часы планировщика.
+
+    Дедлайны задаются по стенным часам и выровнены на границы минут,
+    а ожидание идёт по монотонным часам, поэтому цикл не накапливает дрейф.
+    """
+
+    def __init__(self, tz=LOCAL_TZ):
+        self.tz = tz
+
+    def now(self):
+        return datetime.now(self.tz)
+
+    def minute_start(self, moment=None):
+        moment = moment or self.now()
+        return moment.replace(second=0, microsecond=0)
+
+    def next_minute(self, moment=None):
+        return self.minute_start(moment) + timedelta(minutes=1)
+
+    async def sleep_until(self, deadline, wakeup=None):
+        """Спит до `deadline` или до срабатывания `wakeup`. Возвращает True, если разбудили."""
+        if deadline is None:
+            await wakeup.wait()
+            return True
+        while True:
+            remaining = (deadline - self.now()).total_seconds()
+            if remaining <= 0:
+                return False
+            target = time.monotonic() + min(remaining, MAX_SLEEP_CHUNK)
+            while (delay := target - time.monotonic()) > 0:
+                if wakeup is None:
+                    await asyncio.sleep(delay)
+                    continue
+                try:
+                    await asyncio.wait_for(wakeup.wait(), delay)
+                    return True
+                except asyncio.TimeoutError:
+                    pass
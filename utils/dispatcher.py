@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramMigrateToChat,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from database import claim_deliveries, finish_delivery
+from utils.metrics import DEAD_LETTERS, SEND_ERRORS, SEND_QUEUE, SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: ~30 сообщений/сек на бота, 20 сообщений/мин в группу, ~1/сек в личку
+GLOBAL_RATE = 30
+GROUP_RATE = 20 / 60
+PRIVATE_RATE = 1
+CHAT_BURST = 3
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        # RetryAfter или пауза перед повтором: токены начнут копиться после паузы
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.updated = self.paused_until
+        self.tokens = 0
+
+    def take(self):
+        """Берёт токен без ожидания: 0, если взят, иначе сколько секунд ждать."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        async with self._lock:
+            while wait := self.take():
+                await asyncio.sleep(wait)
+
+
+@dataclass
+class SendJob:
+    chat_id: int
+    text: str
+    on_sent: object = None      # async callable(message)
+    keys: tuple = ()            # [(event_id, fire_at, chat_id)] в журнале deliveries (дайджест — несколько)
+    owned: tuple = ()           # ключи из keys, захваченные этим диспетчером
+    attempts: int = 0
+    errors: list = field(default_factory=list)
+
+
+class NotificationDispatcher:
+    """Пул воркеров для отправки уведомлений.
+
+    Учитывает общий лимит бота и лимит на каждый чат, повторяет отправку
+    после RetryAfter и сетевых ошибок, а неотправленное складывает в dead-letter очередь.
+
+    У каждого чата своя очередь, воркеры обходят готовые чаты по кругу. Воркер
+    не ждёт лимита чата: если токенов нет, чат возвращается в круг, когда токен
+    появится, а воркер берёт следующий чат. Так пачка уведомлений в одну группу
+    не задерживает остальные чаты. Внутри чата порядок сообщений сохраняется.
+
+    Перед первой попыткой доставка захватывается в журнале (pending -> sending
+    с owner): после смены лидера очередь бывшего лидера и досылка нового
+    не отправят одно уведомление дважды.
+    """
+
+    def __init__(self, bot, workers=8, max_retries=5, dead_letter_size=1000, owner=None):
+        self.bot = bot
+        self.owner = owner
+        self.workers = workers
+        self.max_retries = max_retries
+        self.dead_letters = deque(maxlen=dead_letter_size)
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chats = {}
+        self._tasks = []
+        self._inflight = set()  # ключи доставок в очереди или в отправке
+        # chat_id -> очередь SendJob. Чат с непустой очередью всегда ровно в одном
+        # месте: в _ready, в таймере ожидания токена или у воркера
+        self._pending = {}
+        self._ready = asyncio.Queue()
+        self._size = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, chat_id, text, on_sent=None, keys=()):
+        keys = tuple(keys)
+        if keys:
+            if self._inflight.issuperset(keys):
+                return  # эта доставка уже отправляется
+            self._inflight.update(keys)
+        self._size += 1
+        self._idle.clear()
+        self._enqueue(SendJob(chat_id, text, on_sent, keys))
+        SEND_QUEUE.set(self._size)
+
+    def qsize(self):
+        # Сообщений в очередях и в отправке
+        return self._size
+
+    async def join(self):
+        await self._idle.wait()
+
+    def _enqueue(self, job):
+        jobs = self._pending.get(job.chat_id)
+        if jobs is None:
+            self._pending[job.chat_id] = deque([job])
+            self._ready.put_nowait(job.chat_id)
+        else:
+            jobs.append(job)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            rate = GROUP_RATE if chat_id < 0 else PRIVATE_RATE
+            bucket = self._chats[chat_id] = TokenBucket(rate, CHAT_BURST)
+        return bucket
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            chat_id = await self._ready.get()
+            wait = self._chat_bucket(chat_id).take()
+            if wait:
+                # Лимит чата исчерпан — вернём чат в круг, когда появится токен
+                loop.call_later(wait, self._ready.put_nowait, chat_id)
+                continue
+            jobs = self._pending[chat_id]
+            job = jobs.popleft()
+            try:
+                done = await self._deliver(job)
+            except Exception as e:
+                logger.error(f"❌ Непредвиденная ошибка при отправке в {job.chat_id}: {e}")
+                done = True
+            if not done and job.chat_id == chat_id:
+                jobs.appendleft(job)  # повтор после паузы чата, порядок сохраняется
+            elif not done:
+                self._enqueue(job)    # чат перенесён
+            else:
+                self._inflight.difference_update(job.keys)
+                self._size -= 1
+                SEND_QUEUE.set(self._size)
+                if not self._size:
+                    self._idle.set()
+            if jobs:
+                self._ready.put_nowait(chat_id)
+            else:
+                del self._pending[chat_id]
+
+    async def _deliver(self, job):
+        """Одна попытка отправки. False — повторить позже (чат поставлен на паузу)."""
+        job.attempts += 1
+        if job.keys and not job.owned:
+            try:
+                job.owned = tuple(await claim_deliveries(job.keys, self.owner))
+            except Exception as e:
+                self._record_error(job, e)
+                return await self._retry(job, min(2 ** job.attempts, 60))
+            if not job.owned:
+                logger.warning(f"⚠️ Доставка {list(job.keys)} уже захвачена другой репликой, пропускаем")
+                return True
+        await self._global.acquire()
+        try:
+            with SEND_SECONDS.time(chat_id=job.chat_id):
+                msg = await self.bot.send_message(job.chat_id, job.text)
+        except TelegramRetryAfter as e:
+            delay = e.retry_after
+            self._record_error(job, e)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            delay = min(2 ** job.attempts, 60)
+            self._record_error(job, e)
+        except TelegramMigrateToChat as e:
+            # Группа стала супергруппой: отправляем в новый чат (ключи журнала прежние)
+            self._record_error(job, e)
+            logger.warning(f"⚠️ Чат {job.chat_id} перенесён в {e.migrate_to_chat_id}, "
+                           f"обновите его настройки: /addchat {e.migrate_to_chat_id}")
+            job.chat_id = e.migrate_to_chat_id
+            delay = 0
+        except TelegramAPIError as e:
+            # BadRequest, Forbidden, NotFound, Unauthorized и прочее: повтор не поможет
+            self._record_error(job, e)
+            await self._dead_letter(job)
+            return True
+        else:
+            await self._finish(job, "sent", msg.message_id)
+            if job.on_sent:
+                await job.on_sent(msg)
+            return True
+        return await self._retry(job, delay)
+
+    async def _retry(self, job, delay):
+        if job.attempts >= self.max_retries:
+            await self._dead_letter(job)
+            return True
+        logger.warning(f"⚠️ Повтор отправки в {job.chat_id} через {delay} с: {job.errors[-1]}")
+        if delay:
+            self._chat_bucket(job.chat_id).pause(delay)
+        return False
+
+    def _record_error(self, job, error):
+        job.errors.append(error)
+        SEND_ERRORS.inc(chat_id=job.chat_id, error=type(error).__name__)
+
+    async def _finish(self, job, status, message_id=None):
+        # Чужие и не захваченные (ошибка БД) доставки не трогаем
+        if not job.owned:
+            return
+        try:
+            await finish_delivery(job.owned, status, message_id)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при записи доставки {job.owned}: {e}")
+
+    async def _dead_letter(self, job):
+        DEAD_LETTERS.inc(chat_id=job.chat_id)
+        await self._finish(job, "failed")
+        logger.error(f"❌ Уведомление в {job.chat_id} не отправлено после {job.attempts} попыток: {job.errors[-1]}")
+        self.dead_letters.append(job)
@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+# Кэш ивентов процесса. Записи — неизменяемые models.Event, поэтому планировщик
+# и админка держат ссылки на одни и те же объекты.
+
+
+class EventCache:
+    """Ивенты и их доп. чаты в памяти.
+
+    Заполняется один раз из БД и дальше обновляется write-through из
+    database.add_event/delete_event. `version` растёт при каждом изменении —
+    по нему сбрасываются производные кэши (страницы списка ивентов).
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.version = 0
+        self._events = {}
+        self._targets = {}
+
+    def load(self, events, targets):
+        self._events = {event.id: event for event in events}
+        grouped = defaultdict(list)
+        for event_id, chat_id in targets:
+            grouped[event_id].append(chat_id)
+        self._targets = {event_id: tuple(chat_ids) for event_id, chat_ids in grouped.items()}
+        self.loaded = True
+        self.version += 1
+
+    def clear(self):
+        self._events.clear()
+        self._targets.clear()
+
+    def invalidate(self):
+        # Следующее чтение перезагрузит кэш из БД (импорт, изменения другой реплики)
+        self.loaded = False
+        self.clear()
+        self.version += 1
+
+    def put(self, event, targets=()):
+        self.version += 1
+        if not self.loaded:
+            return
+        self._events[event.id] = event
+        if targets:
+            self._targets[event.id] = tuple(targets)
+
+    def remove(self, event_id):
+        self.version += 1
+        if self.loaded:
+            self._events.pop(event_id, None)
+            self._targets.pop(event_id, None)
+
+    # --- Чтение ---
+
+    def __len__(self):
+        return len(self._events)
+
+    def get(self, event_id):
+        return self._events.get(event_id)
+
+    def all(self):
+        return list(self._events.values())
+
+    def targets(self):
+        return [(event_id, chat_id) for event_id, chat_ids in self._targets.items() for chat_id in chat_ids]
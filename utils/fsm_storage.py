@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+import time
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+from database import fsm_get, fsm_purge, fsm_write
+
+logger = logging.getLogger(__name__)
+
+# Незавершённый мастер живёт сутки, после чего сессия удаляется
+DEFAULT_TTL = 24 * 60 * 60
+FLUSH_INTERVAL = 0.5
+PURGE_INTERVAL = 10 * 60
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_states.
+
+    Состояние переживает перезапуск и доступно всем репликам. Записи копятся
+    в памяти и сбрасываются в БД одной транзакцией раз в FLUSH_INTERVAL, поэтому
+    несколько update_data подряд в одном хендлере дают одну запись.
+    В памяти держатся только ещё не сброшенные изменения.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, flush_interval=FLUSH_INTERVAL):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._states = {}   # key -> state, ещё не записанные в БД
+        self._datas = {}    # key -> data, ещё не записанные в БД
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key, state=None):
+        self._states[self.key_builder.build(key)] = state.state if isinstance(state, State) else state
+
+    async def get_state(self, key):
+        built = self.key_builder.build(key)
+        if built in self._states:
+            return self._states[built]
+        return await fsm_get(built, "state")
+
+    async def set_data(self, key, data):
+        self._datas[self.key_builder.build(key)] = data.copy()
+
+    async def get_data(self, key):
+        built = self.key_builder.build(key)
+        if built in self._datas:
+            return self._datas[built].copy()
+        raw = await fsm_get(built, "data")
+        return json.loads(raw) if raw else {}
+
+    async def flush(self):
+        if not self._states and not self._datas:
+            return
+        states, self._states = self._states, {}
+        datas, self._datas = self._datas, {}
+        try:
+            await fsm_write(list(states.items()),
+                            [(key, json.dumps(data, ensure_ascii=False)) for key, data in datas.items()],
+                            time.time() + self.ttl)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при сохранении FSM: {e}")
+            # Возвращаем несохранённое, не затирая более свежие изменения
+            self._states = {**states, **self._states}
+            self._datas = {**datas, **self._datas}
+
+    async def _flush_loop(self):
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                last_purge = time.monotonic()
+                try:
+                    await fsm_purge()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка при очистке FSM: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
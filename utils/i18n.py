@@ -0,0 +1,87 @@
+# Тексты для чатов на разных языках. Язык чата задаётся через /chatset ID lang en.
+
+DEFAULT_LOCALE = "ru"
+
+WEEKDAY_NAMES = {
+    "ru": {"mon": "Пн", "tue": "Вт", "wed": "Ср", "thu": "Чт", "fri": "Пт", "sat": "Сб", "sun": "Вс"},
+    "en": {"mon": "Mon", "tue": "Tue", "wed": "Wed", "thu": "Thu", "fri": "Fri", "sat": "Sat", "sun": "Sun"},
+}
+
+EVENT_TYPE_NAMES = {
+    "ru": {
+        "weekly": "еженедельный",
+        "weekly_once": "1 раз в неделю",
+        "weekly_multiple": "несколько дней в неделю",
+        "once": "одноразовый",
+        "weekday": "будничный",
+        "daily": "ежедневный",
+        "monthly": "ежемесячный",
+        "cron": "по расписанию (cron)",
+    },
+    "en": {
+        "weekly": "weekly",
+        "weekly_once": "once a week",
+        "weekly_multiple": "several days a week",
+        "once": "one-off",
+        "weekday": "weekdays",
+        "daily": "daily",
+        "monthly": "monthly",
+        "cron": "scheduled (cron)",
+    },
+}
+
+# Шаблоны уведомлений по умолчанию: HTML, поля подставляются с экранированием
+# (список полей — utils.templates.FIELDS)
+NOTIFICATION_TEMPLATES = {
+    "ru": {
+        "weekly": "🔁 <b>Ивент:</b> {description}\n🕒 {time}",
+        "once": "📌 <b>Одноразовый ивент:</b> {description}\n🕒 {time}",
+        "weekly_once": "🔂 <b>Еженедельный разовый ивент:</b> {description}\n🕒 {time}",
+        "weekly_multiple": "🔂 <b>Будничный ивент:</b> {description}\n🕒 {time}",
+        "daily": "📅 <b>Ежедневный ивент:</b> {description}\n🕒 {time}",
+        "monthly": "🗓️ <b>Ежемесячный ивент:</b> {description}\n🕒 {time}",
+        "cron": "⏰ <b>Ивент по расписанию:</b> {description}\n🕒 {time}",
+        "reminder": "⏳ <b>Через {before}:</b> {description}\n🕒 {time}",
+    },
+    "en": {
+        "weekly": "🔁 <b>Event:</b> {description}\n🕒 {time}",
+        "once": "📌 <b>One-off event:</b> {description}\n🕒 {time}",
+        "weekly_once": "🔂 <b>Weekly event:</b> {description}\n🕒 {time}",
+        "weekly_multiple": "🔂 <b>Weekday event:</b> {description}\n🕒 {time}",
+        "daily": "📅 <b>Daily event:</b> {description}\n🕒 {time}",
+        "monthly": "🗓️ <b>Monthly event:</b> {description}\n🕒 {time}",
+        "cron": "⏰ <b>Scheduled event:</b> {description}\n🕒 {time}",
+        "reminder": "⏳ <b>In {before}:</b> {description}\n🕒 {time}",
+    },
+}
+
+# Единицы для напоминаний: дни, часы, минуты
+DURATION_UNITS = {
+    "ru": ("д", "ч", "мин"),
+    "en": ("d", "h", "min"),
+}
+
+LOCALES = tuple(NOTIFICATION_TEMPLATES)
+
+
+def get_locale(locale):
+    return locale if locale in NOTIFICATION_TEMPLATES else DEFAULT_LOCALE
+
+
+def format_days(days, locale=DEFAULT_LOCALE):
+    # "mon,wed" -> "Пн, Ср"
+    if not days:
+        return ""
+    names = WEEKDAY_NAMES[get_locale(locale)]
+    return ", ".join(names.get(day, day) for day in days.split(","))
+
+
+def type_name(type_, locale=DEFAULT_LOCALE):
+    return EVENT_TYPE_NAMES[get_locale(locale)].get(type_, str(type_))
+
+
+def format_minutes(minutes, locale=DEFAULT_LOCALE):
+    # 90 -> "1 ч 30 мин", 1440 -> "1 д"
+    units = DURATION_UNITS[get_locale(locale)]
+    parts = (minutes // 1440, minutes % 1440 // 60, minutes % 60)
+    return " ".join(f"{value} {unit}" for value, unit in zip(parts, units) if value) or f"0 {units[-1]}"
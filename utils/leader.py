@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import os
+import socket
+
+from database import acquire_lease, has_external_changes, release_lease
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "scheduler"
+LEASE_TTL = 30
+
+
+def default_replica_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaderElection:
+    """Выбор лидера среди реплик через аренду в общей БД.
+
+    Фоновые задачи (планировщик, удаление сообщений) работают только у лидера.
+    Лидер продлевает аренду каждые ttl/3 секунд; если он пропал, через ttl
+    аренду забирает другая реплика.
+    """
+
+    def __init__(self, replica_id=None, ttl=LEASE_TTL, name=LEASE_NAME):
+        self.replica_id = replica_id or default_replica_id()
+        self.ttl = ttl
+        self.name = name
+        self.is_leader = False
+        self._tasks = []
+
+    async def run(self, jobs, on_external_change=None):
+        """`jobs` — фабрики корутин, которые запускаются при получении лидерства.
+
+        on_external_change(changed) вызывается у лидера со множеством счётчиков
+        изменений (database.REVISIONS), которые обновила другая реплика.
+        """
+        try:
+            while True:
+                try:
+                    leader = await acquire_lease(self.name, self.replica_id, self.ttl)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка при продлении аренды лидера: {e}")
+                    leader = False
+                # Проверяется на всех репликах: заодно сбрасывается кэш ивентов процесса
+                try:
+                    changed = await has_external_changes()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка при проверке изменений БД: {e}")
+                    changed = set()
+
+                if leader and not self.is_leader:
+                    logger.info(f"👑 Реплика {self.replica_id} стала лидером")
+                    self._tasks = [asyncio.create_task(job()) for job in jobs]
+                elif not leader and self.is_leader:
+                    logger.warning(f"⚠️ Реплика {self.replica_id} потеряла лидерство")
+                    await self._stop_tasks()
+                elif leader and on_external_change and changed:
+                    # Другая реплика изменила ивенты, чаты или очередь удаления
+                    on_external_change(changed)
+                self.is_leader = leader
+
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            await self._stop_tasks()
+            if self.is_leader:
+                await release_lease(self.name, self.replica_id)
+                self.is_leader = False
+
+    async def _stop_tasks(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,90 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Уровни по умолчанию: aiogram пишет строку на каждый апдейт
+DEFAULT_LEVELS = "aiogram.event=WARNING,apscheduler=WARNING"
+
+# Стандартные атрибуты LogRecord; всё остальное (extra=...) попадает в JSON как поля
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _LoopQueueHandler(QueueHandler):
+    # Форматирование и запись идут в потоке QueueListener; здесь только подставляем
+    # аргументы сообщения, исключение передаётся как есть (очередь внутри процесса)
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class SampleFilter(logging.Filter):
+    """Пропускает каждую `every`-ю запись (первую — всегда)."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(every, 1)
+        self._count = 0
+
+    def filter(self, record):
+        passed = self._count % self.every == 0
+        self._count += 1
+        return passed
+
+
+def parse_levels(spec):
+    # "utils.scheduler=DEBUG,aiogram=WARNING" -> {"utils.scheduler": "DEBUG", "aiogram": "WARNING"}
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level="INFO", levels="", fmt="json", heartbeat_every=10):
+    """Логирование через очередь: event loop только кладёт запись в очередь,
+    форматирование и вывод — в отдельном потоке.
+
+    `levels` — уровни по модулям поверх DEFAULT_LEVELS, `heartbeat_every` —
+    писать каждый N-й heartbeat.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(_LoopQueueHandler(log_queue))
+    root.setLevel(level.upper())
+    for name, module_level in {**parse_levels(DEFAULT_LEVELS), **parse_levels(levels)}.items():
+        logging.getLogger(name).setLevel(module_level)
+    logging.getLogger("utils.scheduler.heartbeat").addFilter(SampleFilter(heartbeat_every))
+
+    listener.start()
+    # Дописать очередь при выходе
+    atexit.register(listener.stop)
+    return listener
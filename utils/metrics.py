@@ -0,0 +1,170 @@
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Метрики в текстовом формате Prometheus. Все обновления идут из потока event loop,
+# поэтому блокировки не нужны.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LATENESS_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 900)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._values.items()):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # счётчики по корзинам (+Inf последней), сумма, количество
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += bucket_count
+            le = bound if bound == "+Inf" else _format_value(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def register_collector(collector):
+    """`collector` — корутина-функция, обновляющая метрики перед каждым сбором (например, из БД)."""
+    _collectors.append(collector)
+
+
+async def render():
+    for collector in _collectors:
+        try:
+            await collector()
+        except Exception as e:
+            logger.error(f"❌ Ошибка при сборе метрик: {e}")
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Метрики бота ---
+
+TICK_SECONDS = Histogram("scheduler_tick_seconds", "Длительность тика планировщика")
+TICK_LAG_SECONDS = Gauge("scheduler_tick_lag_seconds", "Насколько тик проснулся позже дедлайна")
+LAST_TICK = Gauge("scheduler_last_tick_timestamp_seconds", "Unix-время последнего тика")
+EVENTS_SCANNED = Counter("scheduler_events_scanned_total", "Срабатывания, извлечённые из очереди")
+EVENTS_FIRED = Counter("scheduler_events_fired_total", "Срабатывания, отправленные в рассылку")
+EVENTS_SKIPPED = Counter("scheduler_events_skipped_total", "Пропущенные срабатывания", ["reason"])
+EVENTS_SCHEDULED = Gauge("scheduler_events", "Ивентов в расписании")
+LATENESS_SECONDS = Histogram("notification_lateness_seconds",
+                             "Время отправки уведомления минус запланированная минута", buckets=LATENESS_BUCKETS)
+SEND_SECONDS = Histogram("telegram_send_seconds", "Длительность вызова sendMessage", ["chat_id"])
+SEND_ERRORS = Counter("telegram_send_errors_total", "Ошибки отправки", ["chat_id", "error"])
+DEAD_LETTERS = Counter("telegram_dead_letters_total", "Уведомления, не отправленные после всех попыток",
+                       ["chat_id"])
+SEND_QUEUE = Gauge("telegram_send_queue", "Уведомлений в очереди на отправку")
+PENDING_DELETIONS = Gauge("pending_deletions", "Сообщений в очереди на удаление")
+FSM_SESSIONS = Gauge("fsm_sessions", "Активных сессий мастера создания ивента")
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "Время запроса к БД, включая ожидание потока БД", ["query"])
+
+
+# --- HTTP ---
+
+METRICS_PATH = "/metrics"
+
+
+async def _metrics_handler(request):
+    return web.Response(text=await render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def run_metrics_server(host="127.0.0.1", port=9108):
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📈 Метрики: http://{host}:{port}{METRICS_PATH}")
+    return runner
@@ -0,0 +1,303 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from datetime import date as date_cls, datetime, time as time_cls, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Часовой пояс ивентов по умолчанию
+DEFAULT_TZ_NAME = "Europe/Moscow"
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+WEEKLY_TYPES = ("weekly", "weekly_once", "weekly_multiple")
+ALL_DAYS_MASK = 0b1111111
+
+# NEXT_DAY[mask][weekday] — через сколько дней (0..6) ближайший день из маски
+NEXT_DAY = [
+    [next((shift for shift in range(7) if mask >> ((weekday + shift) % 7) & 1), None) for weekday in range(7)]
+    for mask in range(128)
+]
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    try:
+        return ZoneInfo(name or DEFAULT_TZ_NAME)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+LOCAL_TZ = get_timezone(DEFAULT_TZ_NAME)
+
+
+def parse_days(days):
+    # "mon,wed,fri" -> {0, 2, 4}
+    if not days:
+        return set()
+    return {WEEKDAYS.index(d.strip().lower()) for d in days.split(",") if d.strip().lower() in WEEKDAYS}
+
+
+def days_to_mask(days):
+    # "mon,wed,fri" -> 0b0010101 (бит 0 — понедельник)
+    mask = 0
+    for weekday in parse_days(days):
+        mask |= 1 << weekday
+    return mask
+
+
+def time_to_minute(time_):
+    # "19:30" -> 1170
+    hm = parse_time(time_)
+    return hm[0] * 60 + hm[1] if hm else None
+
+
+def date_to_ordinal(date):
+    # "2026-10-19" -> порядковый номер дня (date.toordinal) или None
+    try:
+        return datetime.strptime(date.strip(), "%Y-%m-%d").toordinal()
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_time(time_):
+    try:
+        t = datetime.strptime(time_.strip(), "%H:%M")
+    except (AttributeError, ValueError):
+        return None
+    return t.hour, t.minute
+
+
+def localize(naive, tz):
+    """Местное время -> aware datetime с учётом перехода на летнее/зимнее время.
+
+    Несуществующее время (перевод часов вперёд) сдвигается на величину перевода,
+    неоднозначное (перевод назад) берётся в первом варианте (fold=0).
+    """
+    aware = naive.replace(tzinfo=tz, fold=0)
+    return datetime.fromtimestamp(aware.timestamp(), tz)
+
+
+# --- Правила повторения ---
+# Каждое правило компилируется один раз и отвечает на вопрос
+# «ближайшее срабатывание не раньше after» без перебора строк и форматирования дат.
+
+class Rule(ABC):
+    __slots__ = ("tz",)
+
+    @abstractmethod
+    def next_after(self, after):
+        """Первое срабатывание не раньше after или None."""
+
+
+class OnceRule(Rule):
+    __slots__ = ("fire_at",)
+
+    def __init__(self, local, tz):
+        self.tz = tz
+        self.fire_at = localize(local, tz)
+
+    def next_after(self, after):
+        return self.fire_at if self.fire_at >= after else None
+
+
+class WeeklyRule(Rule):
+    __slots__ = ("mask", "at")
+
+    def __init__(self, mask, minute, tz):
+        self.tz = tz
+        self.mask = mask
+        self.at = time_cls(minute // 60, minute % 60)
+
+    def next_after(self, after):
+        day = after.astimezone(self.tz).date()
+        # Ближайший день из маски начиная с сегодняшнего; если сегодня время
+        # уже прошло — следующий после него
+        for _ in range(2):
+            day += timedelta(days=NEXT_DAY[self.mask][day.weekday()])
+            fire_at = localize(datetime.combine(day, self.at), self.tz)
+            if fire_at >= after:
+                return fire_at
+            day += timedelta(days=1)
+        return None
+
+
+class DailyRule(WeeklyRule):
+    __slots__ = ()
+
+    def __init__(self, minute, tz):
+        super().__init__(ALL_DAYS_MASK, minute, tz)
+
+
+class MonthlyRule(Rule):
+    __slots__ = ("day", "at")
+
+    def __init__(self, day, minute, tz):
+        self.tz = tz
+        self.day = day
+        self.at = time_cls(minute // 60, minute % 60)
+
+    def next_after(self, after):
+        local = after.astimezone(self.tz)
+        year, month = local.year, local.month
+        # В месяцах без такого числа (31-е, 30 февраля) ивент пропускается
+        for _ in range(13):
+            try:
+                fire_at = localize(datetime.combine(date_cls(year, month, self.day), self.at), self.tz)
+            except ValueError:
+                fire_at = None
+            if fire_at is not None and fire_at >= after:
+                return fire_at
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return None
+
+
+CRON_NAMES = {name: index + 1 for index, name in enumerate(WEEKDAYS)}
+CRON_NAMES["sun"] = 0
+
+
+def _parse_cron_field(field, low, high, names=None):
+    values = set()
+    for part in field.lower().split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/", 1)
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int((names or {}).get(p, p)) for p in part.split("-", 1))
+        else:
+            start = end = int((names or {}).get(part, part))
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(field)
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+class CronRule(Rule):
+    """Упрощённый cron: "минуты часы день_месяца месяц день_недели"."""
+
+    __slots__ = ("minutes", "hours", "days", "months", "weekdays", "any_day", "any_weekday")
+
+    def __init__(self, expression, tz):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(expression)
+        self.tz = tz
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = set(_parse_cron_field(fields[2], 1, 31))
+        self.months = set(_parse_cron_field(fields[3], 1, 12))
+        # 0 и 7 — воскресенье, как в cron; храним в нумерации Python (пн = 0)
+        self.weekdays = {(d - 1) % 7 for d in _parse_cron_field(fields[4], 0, 7, CRON_NAMES)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        in_days = day.day in self.days
+        in_weekdays = day.weekday() in self.weekdays
+        # Как в cron: если заданы и число, и день недели — подходит любое из них
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def _first_time(self, hour, minute):
+        # Первое время из расписания не раньше hour:minute в пределах суток
+        i = bisect_left(self.hours, hour)
+        if i < len(self.hours) and self.hours[i] == hour:
+            j = bisect_left(self.minutes, minute)
+            if j < len(self.minutes):
+                return time_cls(hour, self.minutes[j])
+            i += 1
+        if i < len(self.hours):
+            return time_cls(self.hours[i], self.minutes[0])
+        return None
+
+    def next_after(self, after):
+        local = after.astimezone(self.tz)
+        day = local.date()
+        at = self._first_time(local.hour, local.minute + (1 if local.second or local.microsecond else 0))
+        # Не больше четырёх лет вперёд (29 февраля); иначе выражение не срабатывает никогда
+        for _ in range(366 * 4 + 1):
+            if at is not None and self._day_matches(day):
+                fire_at = localize(datetime.combine(day, at), self.tz)
+                if fire_at >= after:
+                    return fire_at
+            day += timedelta(days=1)
+            at = time_cls(self.hours[0], self.minutes[0])
+        return None
+
+
+def compile_rule(type_, days, date, time_, tz=LOCAL_TZ, rule=None):
+    """Правило повторения для ивента или None, если ивент описан некорректно."""
+    return build_rule(type_, days_to_mask(days), time_to_minute(time_), date_to_ordinal(date), rule, tz)
+
+
+def build_rule(type_, mask, minute, date_ordinal, rule=None, tz=LOCAL_TZ):
+    """То же из уже разобранных полей: маска дней, минута суток, дата разового ивента (ordinal)."""
+    try:
+        if type_ == "cron":
+            return CronRule(rule, tz)
+        if minute is None:
+            return None
+        if type_ == "once":
+            if date_ordinal is None:
+                return None
+            return OnceRule(datetime.fromordinal(date_ordinal) + timedelta(minutes=minute), tz)
+        if type_ in WEEKLY_TYPES:
+            return WeeklyRule(mask, minute, tz) if mask else None
+        if type_ == "daily":
+            return DailyRule(minute, tz)
+        if type_ == "monthly":
+            day = int(rule)
+            return MonthlyRule(day, minute, tz) if 1 <= day <= 31 else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+    return None
+
+
+# --- Напоминания ---
+# Напоминание — уведомление за N минут до срабатывания. Смещения хранятся вместе
+# с ивентом строкой "15,60" и разворачиваются планировщиком в отдельные моменты.
+
+MAX_REMINDER_MINUTES = 7 * 24 * 60
+
+
+def parse_reminders(value):
+    """"15,60" или [15, 60] -> (15, 60): по возрастанию, без повторов. Ошибка — ValueError."""
+    if not value:
+        return ()
+    parts = value.split(",") if isinstance(value, str) else value
+    offsets = set()
+    for part in parts:
+        part = str(part).strip()
+        if not part:
+            continue
+        if not part.isdigit() or not 0 < int(part) <= MAX_REMINDER_MINUTES:
+            raise ValueError(f"напоминание {part!r}: нужно число минут от 1 до {MAX_REMINDER_MINUTES}")
+        offsets.add(int(part))
+    return tuple(sorted(offsets))
+
+
+def format_reminders(reminders):
+    # (15, 60) -> "15,60", пусто -> None (значение для БД)
+    return ",".join(map(str, reminders)) or None
+
+
+def shift_minutes(moment, minutes):
+    # Сдвиг по абсолютному времени: через переход на летнее время напоминание
+    # всё равно приходит ровно за N минут
+    return (moment.astimezone(timezone.utc) + timedelta(minutes=minutes)).astimezone(moment.tzinfo)
+
+
+def next_notification(rule, after, offset=0):
+    """Ближайшее уведомление за `offset` минут до срабатывания `rule`, не раньше `after`.
+
+    Возвращает (момент уведомления, срабатывание) или None; offset=0 — само срабатывание.
+    """
+    if not offset:
+        fire_at = rule.next_after(after)
+        return (fire_at, fire_at) if fire_at else None
+    fire_at = rule.next_after(shift_minutes(after, offset))
+    return (shift_minutes(fire_at, -offset), fire_at) if fire_at else None
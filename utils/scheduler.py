@@ -1,74 +1,487 @@
 import asyncio
-from datetime import datetime, timezone, timedelta
-from database import get_all_events
+import heapq
+from abc import ABC, abstractmethod
+import time
+from collections import defaultdict
+from functools import partial
+from datetime import datetime, timedelta
+from database import (DEFAULT_DELETE_AFTER, claim_occurrences, cleanup_deliveries, get_all_events, get_chats,
+                      get_due_events, get_event_targets, get_pending_deliveries, get_templates, set_next_fire_at)
+from utils.clock import MinuteClock
+from utils.i18n import DEFAULT_LOCALE
+from utils.metrics import (EVENTS_FIRED, EVENTS_SCANNED, EVENTS_SCHEDULED, EVENTS_SKIPPED, LAST_TICK,
+                           LATENESS_SECONDS, TICK_LAG_SECONDS, TICK_SECONDS)
+from utils.recurrence import LOCAL_TZ, get_timezone, next_notification, shift_minutes
+from utils.templates import TemplateEngine
 import logging
 
-# ⏳ Удаление сообщения через указанное время
-async def delete_after_delay(bot, chat_id, message_id, delay=300):
-    await asyncio.sleep(delay)
-    try:
-        await bot.delete_message(chat_id, message_id)
-        print(f"🗑️ Сообщение {message_id} удалено")
-    except Exception as e:
-        logging.warning(f"⚠️ Не удалось удалить сообщение {message_id}: {e}")
+logger = logging.getLogger(__name__)
+heartbeat_logger = logging.getLogger(__name__ + ".heartbeat")
 
-async def schedule_event_notifications(bot, group_id):
-    # Смещение для UTC+3
-    tz_offset = timedelta(hours=3)
+# Насколько поздно ещё можно отправить пропущенное уведомление
+DEFAULT_MAX_LATENESS = timedelta(minutes=15)
+# Сколько хранить журнал доставок
+DELIVERY_RETENTION = timedelta(days=30)
+# Повтор первой загрузки ивентов, если БД недоступна (например, занята другой репликой)
+LOAD_RETRY_DELAY = 1
+LOAD_RETRY_MAX_DELAY = 60
+# Повтор захвата срабатываний, если БД недоступна
+CLAIM_RETRY_DELAY = timedelta(seconds=5)
+# Лимит длины сообщения Telegram и разделитель уведомлений в дайджесте
+MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n"
 
-    while True:
-        # Текущее время на сервере в UTC
-        now_utc = datetime.now(timezone.utc)
-        # Преобразуем в UTC+3
-        now_local = now_utc.astimezone(timezone(tz_offset))
 
-        today = now_local.strftime("%Y-%m-%d")
-        weekday = now_local.strftime("%a").lower()
-        current_time = now_local.strftime("%H:%M")
-        timestamp = now_local.strftime("%Y-%m-%d %H:%M:%S")
+def split_digest(texts, limit=MESSAGE_LIMIT, separator=DIGEST_SEPARATOR):
+    """Делит тексты на сообщения не длиннее limit (вместе с разделителями).
+
+    Возвращает списки индексов текстов; текст длиннее limit уходит отдельным сообщением.
+    """
+    chunks, current, size = [], [], 0
+    for index, text in enumerate(texts):
+        extra = len(text) + (len(separator) if current else 0)
+        if current and size + extra > limit:
+            chunks.append(current)
+            current, size, extra = [], 0, len(text)
+        current.append(index)
+        size += extra
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class SchedulerBackend(ABC):
+    """Общая часть планировщиков: ивенты, чаты, рассылка и удаление уведомлений.
+
+    Реализации — EventScheduler (собственный цикл с кучей) и APSchedulerBackend
+    (задачи APScheduler в SQLite, utils/aps_backend.py). Хендлеры работают только
+    через add_event/remove_event/update_chat, бот запускает run() у лидера.
+
+    С digest=True уведомления, сработавшие в одном тике, уходят в чат одним
+    сообщением. Это работает в EventScheduler; APScheduler запускает задачи
+    ивентов по одной, там каждое уведомление отправляется отдельно.
+    """
+
+    def __init__(self, bot, default_chat_id, dispatcher, deleter, clock=None, max_lateness=DEFAULT_MAX_LATENESS,
+                 replica_id=None, digest=False):
+        self.bot = bot
+        self.replica_id = replica_id
+        self.default_chat_id = default_chat_id
+        self.dispatcher = dispatcher
+        self.deleter = deleter
+        self.clock = clock or MinuteClock()
+        self.max_lateness = max_lateness
+        self.digest = digest
+        self._events = {}      # event_id -> models.Event
+        self._rules = {}       # event_id -> скомпилированное правило повторения
+        self._targets = defaultdict(set)  # event_id -> дополнительные чаты рассылки
+        self._chats = {}       # chat_id -> (tz, delete_after)
+        self.templates = TemplateEngine()
+
+    @abstractmethod
+    def add_event(self, event, targets=()):
+        ...
+
+    @abstractmethod
+    def remove_event(self, event_id):
+        ...
+
+    def update_event(self, event):
+        # Изменились поля ивента (напоминания), доп. чаты рассылки те же
+        self.add_event(event, self._targets.get(event.id, ()))
+
+    @abstractmethod
+    async def update_chat(self, chat_id, title, timezone, delete_after, locale=DEFAULT_LOCALE):
+        ...
+
+    @abstractmethod
+    def request_reload(self):
+        ...
+
+    @abstractmethod
+    async def run(self):
+        ...
+
+    @abstractmethod
+    async def _load_from_db(self):
+        # True, если ивенты и чаты загружены
+        ...
+
+    async def _initial_load(self):
+        # Без первой загрузки планировщику нечего запускать (а APScheduler удалил бы
+        # задачи при сверке) — повторяем до успеха
+        delay = LOAD_RETRY_DELAY
+        while not await self._load_from_db():
+            logger.warning(f"⚠️ Повтор загрузки ивентов через {delay} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LOAD_RETRY_MAX_DELAY)
 
-        print(f"⏰ [{timestamp}] Бот работает")
+    def _load_chats(self, chats, targets, templates=()):
+        self._targets.clear()
+        self._chats.clear()
+        for chat in chats:
+            self._set_chat(*chat)
+        for event_id, chat_id in targets:
+            self._targets[event_id].add(chat_id)
+        self.templates.load(templates)
 
+    def _set_chat(self, chat_id, title, timezone, delete_after, locale=DEFAULT_LOCALE):
+        self._chats[chat_id] = (get_timezone(timezone) or LOCAL_TZ, delete_after)
+        self.templates.set_locale(chat_id, locale)
+
+    def _chat_tz(self, chat_id):
+        return self._chats.get(chat_id, (LOCAL_TZ,))[0]
+
+    def _delete_after(self, chat_id):
+        return self._chats.get(chat_id, (None, DEFAULT_DELETE_AFTER))[1]
+
+    def _recipients(self, event):
+        chat_id = event.chat_id or self.default_chat_id
+        return [chat_id, *sorted(self._targets.get(event.id, set()) - {chat_id})]
+
+    def _rule(self, event):
+        # Правило компилируется один раз и сбрасывается при изменении ивента или пояса чата
+        if event.id not in self._rules:
+            self._rules[event.id] = event.compile(self._chat_tz(event.chat_id))
+        return self._rules[event.id]
+
+    def _deliveries(self, fire_at, event, offset=0):
+        # Текст уведомления для каждого чата рассылки: [(chat_id, text), ...];
+        # для напоминания fire_at — момент отправки, в текст идёт время срабатывания
+        return self.templates.render(shift_minutes(fire_at, offset), event, self._recipients(event), offset)
+
+    def _deliveries_batch(self, occurrences):
+        # [(notify_at, event, offset)] -> {(event_id, notify_ts): [(chat_id, text), ...]},
+        # шаблоны рендерятся пачкой
+        rendered = self.templates.render_batch(
+            [(shift_minutes(notify_at, offset), event, self._recipients(event), offset)
+             for notify_at, event, offset in occurrences])
+        return {(event.id, int(notify_at.timestamp())): deliveries
+                for (notify_at, event, _), deliveries in zip(occurrences, rendered)}
+
+    def _send(self, fire_at, event_id, deliveries):
+        logger.info(f"📨 Отправка уведомления в {len(deliveries)} чат(ов): {deliveries[0][1]}",
+                    extra={"event_id": event_id, "fire_at": fire_at.isoformat(),
+                           "chats": [chat_id for chat_id, _ in deliveries]})
+        EVENTS_FIRED.inc()
+        fire_ts = int(fire_at.timestamp())
+        for chat_id, text in deliveries:
+            self.dispatcher.submit(chat_id, text, on_sent=partial(self._on_sent, fire_at=fire_at),
+                                   keys=[(event_id, fire_ts, chat_id)])
+
+    def _send_digest(self, occurrences):
+        # occurrences: [(fire_at, event_id, [(chat_id, text), ...])] одного тика
+        by_chat = defaultdict(list)
+        for fire_at, event_id, deliveries in occurrences:
+            for chat_id, text in deliveries:
+                by_chat[chat_id].append((fire_at, (event_id, int(fire_at.timestamp()), chat_id), text))
+        EVENTS_FIRED.inc(len(occurrences))
+        messages = sum(self._submit_digest(chat_id, entries) for chat_id, entries in by_chat.items())
+        logger.info(f"📨 Дайджест: {len(occurrences)} ивент(ов), {messages} сообщений в {len(by_chat)} чат(ов)",
+                    extra={"events": [event_id for _, event_id, _ in occurrences], "chats": list(by_chat)})
+
+    def _submit_digest(self, chat_id, entries):
+        # entries: [(fire_at, ключ журнала, text)] одного чата -> одно или несколько сообщений
+        chunks = split_digest([text for _, _, text in entries])
+        for chunk in chunks:
+            part = [entries[index] for index in chunk]
+            self.dispatcher.submit(chat_id, DIGEST_SEPARATOR.join(text for _, _, text in part),
+                                   on_sent=partial(self._on_sent, fire_at=min(fire_at for fire_at, _, _ in part)),
+                                   keys=[key for _, key, _ in part])
+        return len(chunks)
+
+    async def _resume_deliveries(self):
+        # Доставки, захваченные до падения процесса или смены лидера, но не отправленные
+        now = self.clock.now()
+        since = int((now - self.max_lateness).timestamp())
         try:
-            events = get_all_events()
+            await cleanup_deliveries(since, int((now - DELIVERY_RETENTION).timestamp()))
+            pending = await get_pending_deliveries(since)
         except Exception as e:
-            logging.error(f"❌ Ошибка при получении ивентов из БД: {e}")
-            await asyncio.sleep(60)
-            continue
+            logger.error(f"❌ Ошибка при чтении журнала доставок: {e}")
+            return
+        if pending:
+            logger.warning(f"⚠️ Досылаем незавершённые доставки: {len(pending)}")
+        by_chat = defaultdict(list)
+        for event_id, fire_ts, chat_id, text in pending:
+            fire_at = datetime.fromtimestamp(fire_ts, self._chat_tz(chat_id))
+            by_chat[chat_id].append((fire_at, (event_id, fire_ts, chat_id), text))
+        for chat_id, entries in by_chat.items():
+            if self.digest:
+                self._submit_digest(chat_id, entries)
+                continue
+            for fire_at, key, text in entries:
+                self.dispatcher.submit(chat_id, text, on_sent=partial(self._on_sent, fire_at=fire_at), keys=[key])
+
+    async def _on_sent(self, msg, fire_at=None):
+        if fire_at is not None:
+            LATENESS_SECONDS.observe(max((self.clock.now() - fire_at).total_seconds(), 0))
+        # ⏱️ Удаление через заданное в настройках чата время (по умолчанию 10 минут)
+        delay = self._delete_after(msg.chat.id)
+        if delay:
+            await self.deleter.schedule(msg.chat.id, msg.message_id, delay=delay)
+
+
+class EventScheduler(SchedulerBackend):
+    """Очередь ивентов по времени ближайшего срабатывания.
+
+    Правило повторения ивента компилируется один раз, следующее срабатывание
+    считается по нему (в поясе чата ивента) и хранится в куче, цикл спит до самого
+    раннего дедлайна и пересчитывает только сработавшие ивенты. Один процесс
+    обслуживает все зарегистрированные чаты.
+
+    Напоминания (event.reminders) — отдельные записи кучи со смещением в минутах:
+    каждое уведомление ивента пересчитывается само по себе, ивенты без напоминаний
+    стоят в куче одной записью, как и раньше.
+    """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._heap = []        # (notify_at, event_id, offset), offset=0 — само срабатывание
+        self._next_fire = {}   # (event_id, offset) -> актуальный notify_at
+        self._wakeup = asyncio.Event()
+        self._reload = False
+        self._retry_at = None  # не раньше этого момента повторяем неудавшийся захват
+
+    def load(self, events, missed=(), chats=(), targets=(), now=None, templates=()):
+        now = now or self.clock.minute_start()
+        self._heap.clear()
+        self._events.clear()
+        self._rules.clear()
+        self._next_fire.clear()
+        self._load_chats(chats, targets, templates)
         for event in events:
-            event_id, type_, days, date, time_, desc = event
-
-            try:
-                send = False
-                message = ""
-
-                if type_ == "weekly":
-                    if days and weekday in days.split(",") and time_ == current_time:
-                        message = f"🔁 <b>Ивент:</b> {desc}\n🕒 {time_}"
-                        send = True
-
-                elif type_ == "once":
-                    if date == today and time_ == current_time:
-                        message = f"📌 <b>Одноразовый ивент:</b> {desc}\n🕒 {time_}"
-                        send = True
-
-                elif type_ == "weekly_once":
-                    if weekday in (days or "") and time_ == current_time:
-                        message = f"🔂 <b>Еженедельный разовый ивент:</b> {desc}\n🕒 {time_}"
-                        send = True
-
-                elif type_ == "weekly_multiple":
-                    if weekday in (days or "") and time_ == current_time:
-                        message = f"🔂 <b>Будничный ивент:</b> {desc}\n🕒 {time_}"
-                        send = True
-
-                if send:
-                    print(f"📨 [{timestamp}] Отправка уведомления: {message}")
-                    msg = await bot.send_message(group_id, message)
-                    # ⏱️ Удаление через 5 минут
-                    asyncio.create_task(delete_after_delay(bot, group_id, msg.message_id, delay=600))
-            except Exception as e:
-                logging.error(f"❌ Ошибка при обработке ивента {event_id}: {e}")
-
-        await asyncio.sleep(60)
+            self._arm(event, now)
+        # Уведомления, пропущенные пока бот был остановлен (next_fire_at в прошлом):
+        # next_fire_at — ближайшее из уведомлений ивента, от него ищем первое
+        # пропущенное для каждого смещения
+        for event, next_fire_at in missed:
+            tz = self._chat_tz(event.chat_id)
+            compiled = event.compile(tz)
+            if compiled is None:
+                continue
+            since = datetime.fromtimestamp(next_fire_at, tz)
+            for offset in event.offsets:
+                item = next_notification(compiled, since, offset)
+                if item and item[0] < now:
+                    self._events[event.id] = event
+                    self._next_fire[(event.id, offset)] = item[0]
+                    self._heap.append((item[0], event.id, offset))
+        heapq.heapify(self._heap)
+
+    def add_event(self, event, targets=()):
+        self._targets[event.id] = set(targets) - {event.chat_id}
+        self._rules.pop(event.id, None)
+        self._forget(event.id)
+        self._arm(event, self.clock.minute_start(), push=True)
+        self._wakeup.set()
+
+    def remove_event(self, event_id):
+        # Записи в куче остаются и будут пропущены при извлечении
+        self._forget(event_id)
+        self._events.pop(event_id, None)
+        self._rules.pop(event_id, None)
+        self._targets.pop(event_id, None)
+
+    def _forget(self, event_id):
+        event = self._events.get(event_id)
+        for offset in event.offsets if event else ():
+            self._next_fire.pop((event_id, offset), None)
+
+    async def update_chat(self, chat_id, title, timezone, delete_after, locale=DEFAULT_LOCALE):
+        # Новый часовой пояс — перепланируем ивенты этого чата
+        self._set_chat(chat_id, title, timezone, delete_after, locale)
+        now = self.clock.minute_start()
+        rearmed = []
+        for event in [e for e in self._events.values() if e.chat_id == chat_id]:
+            self._rules.pop(event.id, None)
+            self._arm(event, now, push=True)
+            rearmed.append(self._next_fire_item(event.id))
+        if rearmed:
+            await set_next_fire_at(rearmed)
+        self._wakeup.set()
+
+    def _arm(self, event, after, push=False):
+        # Все уведомления ивента: срабатывание и напоминания
+        self._events[event.id] = event
+        for offset in event.offsets:
+            self._arm_offset(event, offset, after, push)
+        self._drop_if_done(event)
+
+    def _arm_offset(self, event, offset, after, push=False):
+        key = (event.id, offset)
+        compiled = self._rule(event)
+        item = next_notification(compiled, after, offset) if compiled else None
+        if item is None:
+            self._next_fire.pop(key, None)
+            return
+        notify_at = item[0]
+        self._next_fire[key] = notify_at
+        if push:
+            heapq.heappush(self._heap, (notify_at, event.id, offset))
+        else:
+            self._heap.append((notify_at, event.id, offset))
+
+    def _drop_if_done(self, event):
+        # У ивента не осталось будущих уведомлений (разовый уже сработал)
+        if not any((event.id, offset) in self._next_fire for offset in event.offsets):
+            self._events.pop(event.id, None)
+            self._rules.pop(event.id, None)
+
+    def _next_fire_item(self, event_id):
+        # (ближайшее уведомление ивента, id) для next_fire_at в БД
+        event = self._events.get(event_id)
+        moments = [self._next_fire[key] for key in ((event_id, offset) for offset in event.offsets)
+                   if key in self._next_fire] if event else []
+        return int(min(moments).timestamp()) if moments else None, event_id
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            notify_at, event_id, offset = heapq.heappop(self._heap)
+            EVENTS_SCANNED.inc()
+            key = (event_id, offset)
+            if self._next_fire.get(key) != notify_at:
+                continue  # ивент удалён или перепланирован
+            del self._next_fire[key]
+            due.append((notify_at, self._events[event_id], offset))
+        return due
+
+    async def _wait(self):
+        EVENTS_SCHEDULED.set(len(self._events))
+        deadline = self._heap[0][0] if self._heap else None
+        wake_at = max(deadline, self._retry_at) if deadline and self._retry_at else deadline
+        await self.clock.sleep_until(wake_at, self._wakeup)
+        self._wakeup.clear()
+        self._retry_at = None
+        return deadline
+
+    def request_reload(self):
+        # Ивенты изменились в обход этого процесса (другая реплика) — перечитаем БД
+        self._reload = True
+        self._wakeup.set()
+
+    async def _load_from_db(self):
+        try:
+            now = self.clock.minute_start()
+            since = int((now - self.max_lateness).timestamp())
+            missed = await get_due_events(since, int(now.timestamp()) - 1)
+            self.load(await get_all_events(), missed, await get_chats(), await get_event_targets(), now,
+                      await get_templates())
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении ивентов из БД: {e}")
+            return False
+        return True
+
+
+    async def _claim(self, due, deliveries):
+        # Перепланируем сработавшие уведомления и атомарно захватываем их в БД вместе
+        # с журналом доставок, чтобы каждое ушло один раз. Ключ захвата — момент
+        # уведомления: они идут по возрастанию, поэтому CAS по last_fired_at
+        # работает для напоминаний так же, как для срабатываний.
+        # None — захват не удался, уведомления вернулись в кучу
+        for notify_at, event, offset in due:
+            if event.id in self._events:
+                after = max(notify_at + timedelta(minutes=1), self.clock.minute_start() - self.max_lateness)
+                self._arm_offset(event, offset, after, push=True)
+        items = {}
+        for notify_at, event, _ in due:
+            key = (event.id, int(notify_at.timestamp()))
+            if key not in items:
+                items[key] = (*key, self._next_fire_item(event.id)[0])
+        try:
+            claimed = await claim_occurrences(list(items.values()), self.replica_id, deliveries)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при захвате срабатываний, повтор через {CLAIM_RETRY_DELAY.seconds} с: {e}")
+            self._restore(due)
+            return None
+        for _, event, _ in due:
+            if self._events.get(event.id) is event:
+                self._drop_if_done(event)
+        return claimed
+
+    def _restore(self, due):
+        # Незахваченные уведомления снова ждут в куче (следующие, взведённые
+        # в _claim, становятся устаревшими записями); удалённые и изменённые
+        # за время захвата ивенты не возвращаем
+        for notify_at, event, offset in due:
+            if self._events.get(event.id) is event:
+                self._next_fire[(event.id, offset)] = notify_at
+                heapq.heappush(self._heap, (notify_at, event.id, offset))
+        self._retry_at = self.clock.now() + CLAIM_RETRY_DELAY
+
+    async def run(self):
+        await self._initial_load()
+        await self._resume_deliveries()
+
+        while True:
+            deadline = await self._wait()
+            if self._reload:
+                # При ошибке остаётся прежнее расписание, перечитаем на следующем проходе
+                self._reload = not await self._load_from_db()
+            with TICK_SECONDS.time():
+                await self._tick(deadline)
+
+    async def _tick(self, deadline):
+        tick = self.clock.minute_start()
+        LAST_TICK.set(time.time())
+        if deadline:
+            TICK_LAG_SECONDS.set(max((self.clock.now() - deadline).total_seconds(), 0))
+        if deadline and tick - deadline >= timedelta(minutes=1):
+            # Цикл проснулся позже дедлайна (долгие отправки, зависание, сон процесса)
+            skipped = int((tick - deadline).total_seconds() // 60)
+            logger.warning(f"⚠️ Пропущено минут: {skipped}, догоняем ивенты с {deadline:%H:%M}")
+
+        # Всё, что должно было сработать до текущей минуты включительно,
+        # в том числе за пропущенные минуты
+        due = self._pop_due(tick)
+        if not due:
+            return
+        now = self.clock.now()
+        occurrences = []
+        seen = set()
+        for notify_at, event, offset in due:
+            lateness = now - notify_at
+            if lateness > self.max_lateness:
+                # Срабатывание всё равно захватывается, чтобы сдвинуть next_fire_at
+                EVENTS_SKIPPED.inc(reason="late")
+                logger.warning(f"⚠️ Ивент {event.id} на {notify_at:%Y-%m-%d %H:%M} пропущен: опоздание {lateness}")
+                continue
+            # Напоминание, совпавшее по времени с другим уведомлением того же ивента
+            # (за сутки до ежедневного), не дублируется: остаётся меньшее смещение
+            key = (event.id, notify_at)
+            if key not in seen:
+                seen.add(key)
+                occurrences.append((notify_at, event, offset))
+        try:
+            deliveries = self._deliveries_batch(occurrences)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при подготовке уведомлений: {e}")
+            deliveries = {}
+
+        claimed = await self._claim(due, deliveries)
+        if claimed is None:
+            return  # ничего не отправляем, пока срабатывания не захвачены
+        ready = []
+        for notify_at, event, _ in occurrences:
+            key = (event.id, int(notify_at.timestamp()))
+            if key not in deliveries:
+                continue
+            if key not in claimed:
+                EVENTS_SKIPPED.inc(reason="claimed")
+                continue  # уже отправлено другой репликой
+            if deliveries[key]:
+                ready.append((notify_at, event.id, deliveries[key]))
+        if self.digest and ready:
+            self._send_digest(ready)
+            return
+        for fire_at, event_id, event_deliveries in ready:
+            self._send(fire_at, event_id, event_deliveries)
+
+
+async def heartbeat(clock=None):
+    clock = clock or MinuteClock()
+    while True:
+        # Пишется каждая N-я запись (HEARTBEAT_LOG_EVERY), см. utils.log
+        heartbeat_logger.info("⏰ Бот работает", extra={"at": clock.now().isoformat()})
+        await clock.sleep_until(clock.next_minute())
@@ -0,0 +1,99 @@
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import database
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = "events-"
+# Страниц за шаг backup; между шагами запись в БД не блокируется
+BACKUP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.005
+
+
+def make_snapshot(dest_path, compress=False, pages=BACKUP_PAGES, step_sleep=BACKUP_STEP_SLEEP):
+    """Согласованная копия БД через sqlite3 backup API (выполняется в отдельном потоке).
+
+    Копия делается со своего соединения, поэтому не занимает поток БД. Если во время
+    копирования в БД пишут, SQLite сам начинает копирование заново, и в файл попадает
+    состояние на один момент времени.
+    """
+    part = dest_path + ".part"
+    src = sqlite3.connect(database.DB_PATH)
+    dst = sqlite3.connect(part)
+    try:
+        src.backup(dst, pages=pages, sleep=step_sleep)
+        # Снимок — один самодостаточный файл, без -wal рядом
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+    try:
+        if compress:
+            with open(part, "rb") as f, gzip.open(dest_path, "wb", compresslevel=6) as out:
+                shutil.copyfileobj(f, out, 1 << 20)
+            os.remove(part)
+        else:
+            os.replace(part, dest_path)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+    return dest_path
+
+
+class SnapshotService:
+    """Снимки БД: по запросу (/getdb) и по расписанию с ротацией.
+
+    Плановые снимки складываются в `directory`, хранятся последние `keep`. Время
+    следующего снимка считается от самого свежего файла, поэтому перезапуск бота
+    не плодит лишних копий.
+    """
+
+    def __init__(self, directory="backups", interval=timedelta(hours=24), keep=7, compress=True):
+        self.directory = directory
+        self.interval = interval
+        self.keep = max(keep, 1)
+        self.compress = compress
+
+    async def create(self, dest_path, compress=False):
+        started = time.perf_counter()
+        await asyncio.to_thread(make_snapshot, dest_path, compress)
+        logger.info(f"💾 Снимок БД: {dest_path} ({os.path.getsize(dest_path)} байт, "
+                    f"{time.perf_counter() - started:.2f} с)")
+        return dest_path
+
+    def _snapshots(self):
+        if not os.path.isdir(self.directory):
+            return []
+        # Имена содержат время создания, сортировка по имени — хронологическая
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.startswith(SNAPSHOT_PREFIX) and not name.endswith(".part"))
+
+    def prune(self):
+        for path in self._snapshots()[:-self.keep]:
+            os.remove(path)
+            logger.info(f"🗑️ Удалён старый снимок БД: {path}")
+
+    def _next_at(self):
+        snapshots = self._snapshots()
+        if not snapshots:
+            return time.time()
+        return os.path.getmtime(snapshots[-1]) + self.interval.total_seconds()
+
+    async def run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            await asyncio.sleep(max(self._next_at() - time.time(), 0))
+            name = f"{SNAPSHOT_PREFIX}{datetime.now():%Y%m%d-%H%M%S}.db" + (".gz" if self.compress else "")
+            try:
+                await self.create(os.path.join(self.directory, name), self.compress)
+                await asyncio.to_thread(self.prune)
+            except Exception as e:
+                logger.error(f"❌ Ошибка при создании снимка БД: {e}")
+                await asyncio.sleep(60)
@@ -0,0 +1,139 @@
+import html
+import logging
+from string import Formatter
+
+from utils.i18n import DEFAULT_LOCALE, NOTIFICATION_TEMPLATES, format_days, format_minutes, get_locale, type_name
+
+logger = logging.getLogger(__name__)
+
+# Поля, доступные в шаблонах уведомлений
+FIELDS = ("description", "time", "date", "days", "type", "id", "before")
+# chat_id шаблона, действующего во всех чатах без собственного
+ALL_CHATS = 0
+# Шаблон напоминаний (за N минут до срабатывания) — общий для всех типов ивентов
+REMINDER = "reminder"
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class Template:
+    """Шаблон уведомления, разобранный один раз.
+
+    Текст шаблона — HTML (в нём можно использовать разметку), значения полей
+    экранируются перед подстановкой.
+    """
+
+    __slots__ = ("source", "_parts")
+
+    def __init__(self, source):
+        try:
+            parsed = list(Formatter().parse(source))
+        except ValueError as e:
+            raise TemplateError(f"ошибка в шаблоне: {e}") from None
+        parts = []
+        for literal, field, spec, conversion in parsed:
+            if field is not None and field not in FIELDS:
+                raise TemplateError(f"неизвестное поле {{{field}}}, доступны: {', '.join(FIELDS)}")
+            if spec or conversion:
+                raise TemplateError(f"форматирование поля {{{field}}} не поддерживается")
+            parts.append((literal, field))
+        self.source = source
+        self._parts = tuple(parts)
+
+    def render(self, values):
+        # values — уже экранированные строки
+        return "".join(literal + values[field] if field else literal for literal, field in self._parts)
+
+
+def field_values(event, fire_at, locale=DEFAULT_LOCALE, offset=0):
+    # fire_at — срабатывание ивента (для напоминания — то, о котором оно напоминает)
+    return {
+        "description": html.escape(event.description or "", quote=False),
+        "time": html.escape(event.time or fire_at.strftime("%H:%M"), quote=False),
+        "date": fire_at.strftime("%d.%m.%Y"),
+        "days": html.escape(format_days(event.days, locale), quote=False),
+        "type": html.escape(type_name(event.type, locale), quote=False),
+        "id": str(event.id),
+        "before": html.escape(format_minutes(offset, locale), quote=False) if offset else "",
+    }
+
+
+class TemplateEngine:
+    """Шаблоны уведомлений по типу ивента и чату.
+
+    Порядок поиска: шаблон чата, общий шаблон (ALL_CHATS), шаблон языка чата
+    по умолчанию. Напоминания ищутся так же по типу REMINDER. Скомпилированные шаблоны кэшируются по (chat_id, type) до
+    изменения шаблонов или языка чата.
+    """
+
+    def __init__(self):
+        self._sources = {}   # (chat_id, type) -> текст шаблона из БД
+        self._locales = {}   # chat_id -> язык
+        self._compiled = {}  # (chat_id, type) -> Template или None
+
+    def load(self, templates):
+        self._sources = {(chat_id, type_): source for chat_id, type_, source in templates}
+        self._compiled.clear()
+
+    def set_locale(self, chat_id, locale):
+        locale = get_locale(locale)
+        if self._locales.get(chat_id, DEFAULT_LOCALE) != locale:
+            self._compiled.clear()
+        self._locales[chat_id] = locale
+
+    def locale(self, chat_id):
+        return self._locales.get(chat_id, DEFAULT_LOCALE)
+
+    def set_template(self, chat_id, type_, source):
+        """`source=None` возвращает шаблон по умолчанию. Некорректный шаблон — TemplateError."""
+        if source is None:
+            self._sources.pop((chat_id, type_), None)
+        else:
+            Template(source)
+            self._sources[(chat_id, type_)] = source
+        self._compiled.clear()
+
+    def template(self, chat_id, type_):
+        key = (chat_id, type_)
+        if key not in self._compiled:
+            self._compiled[key] = self._compile(chat_id, type_)
+        return self._compiled[key]
+
+    def _compile(self, chat_id, type_):
+        for source in (self._sources.get((chat_id, type_)), self._sources.get((ALL_CHATS, type_))):
+            if source is None:
+                continue
+            try:
+                return Template(source)
+            except TemplateError as e:
+                logger.error(f"❌ Некорректный шаблон {type_} для чата {chat_id}: {e}")
+        source = NOTIFICATION_TEMPLATES[self.locale(chat_id)].get(type_)
+        return Template(source) if source else None
+
+    def render(self, fire_at, event, chat_ids, offset=0):
+        return self.render_batch([(fire_at, event, chat_ids, offset)])[0]
+
+    def render_batch(self, occurrences):
+        """[(fire_at, event, chat_ids, offset)] -> [[(chat_id, text), ...], ...].
+
+        offset > 0 — напоминание за offset минут до срабатывания fire_at. Значения
+        полей экранируются один раз на срабатывание и язык, шаблоны берутся из кэша.
+        Чаты без шаблона для типа ивента пропускаются.
+        """
+        rendered = []
+        for fire_at, event, chat_ids, offset in occurrences:
+            type_ = REMINDER if offset else event.type
+            values = {}
+            deliveries = []
+            for chat_id in chat_ids:
+                template = self.template(chat_id, type_)
+                if template is None:
+                    continue
+                locale = self.locale(chat_id)
+                if locale not in values:
+                    values[locale] = field_values(event, fire_at, locale, offset)
+                deliveries.append((chat_id, template.render(values[locale])))
+            rendered.append(deliveries)
+        return rendered
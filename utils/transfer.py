@@ -0,0 +1,113 @@
+import csv
+import json
+from itertools import islice
+
+from utils.recurrence import LOCAL_TZ, compile_rule, parse_reminders
+
+# Импорт и экспорт ивентов в JSONL/CSV. Всё построено на генераторах: файл читается
+# построчно, строки проверяются и уходят в БД пачками, в памяти держится одна пачка.
+
+FIELDS = ("type", "days", "date", "time", "description", "chat_id", "rule", "targets", "reminders")
+EVENT_TYPES = ("once", "weekly", "weekly_once", "weekly_multiple", "daily", "monthly", "cron")
+BATCH_SIZE = 500
+MAX_ERRORS = 10
+
+
+class TransferError(ValueError):
+    def __init__(self, errors):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+def detect_format(filename):
+    return "csv" if (filename or "").lower().endswith(".csv") else "jsonl"
+
+
+def read_records(f, fmt):
+    """(номер строки, dict или исключение разбора) для каждой записи файла."""
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_no, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, e
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _parse_targets(value):
+    if isinstance(value, list):
+        return [int(chat_id) for chat_id in value]
+    return [int(chat_id) for chat_id in (_clean(value) or "").replace(";", ",").split(",") if chat_id.strip()]
+
+
+def validate_record(record, default_chat_id):
+    """Запись файла -> (type, days, date, time, description, chat_id, rule, targets, reminders) или ValueError."""
+    if isinstance(record, Exception):
+        raise ValueError(f"не JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("ожидается объект")
+    type_ = _clean(record.get("type"))
+    if type_ not in EVENT_TYPES:
+        raise ValueError(f"неизвестный тип {type_!r}")
+    days = _clean(record.get("days"))
+    if days:
+        days = ",".join(day.strip().lower() for day in days.split(",") if day.strip())
+    date, time_, rule = (_clean(record.get(key)) for key in ("date", "time", "rule"))
+    description = _clean(record.get("description"))
+    if not description:
+        raise ValueError("пустое описание")
+    chat_id = int(_clean(record.get("chat_id")) or default_chat_id)
+    targets = _parse_targets(record.get("targets"))
+    reminders = parse_reminders(record.get("reminders"))
+    if compile_rule(type_, days, date, time_, LOCAL_TZ, rule) is None:
+        raise ValueError("некорректное расписание (days/date/time/rule)")
+    return type_, days, date, time_, description, chat_id, rule, targets, reminders
+
+
+def validated(records, default_chat_id, errors, max_errors=MAX_ERRORS):
+    # Ошибки копятся в `errors`; после max_errors разбор прекращается
+    for line_no, record in records:
+        try:
+            yield validate_record(record, default_chat_id)
+        except (ValueError, TypeError) as e:
+            errors.append(f"строка {line_no}: {e}")
+            if len(errors) >= max_errors:
+                return
+
+
+def batched(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def write_records(f, rows, fmt):
+    """Пишет строки (поля в порядке FIELDS, targets — "id,id", reminders — "15,60") и возвращает их количество."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for row in rows:
+            writer.writerow(["" if value is None else value for value in row])
+            count += 1
+        return count
+    for row in rows:
+        record = dict(zip(FIELDS, row))
+        record["targets"] = _parse_targets(record["targets"])
+        record["reminders"] = list(parse_reminders(record["reminders"]))
+        f.write(json.dumps({key: value for key, value in record.items() if value not in (None, [])},
+                           ensure_ascii=False) + "\n")
+        count += 1
+    return count
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+
+from aiogram import BaseMiddleware
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/webhook"
+HEALTH_PATH = "/healthz"
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Ограничивает число апдейтов, обрабатываемых одновременно."""
+
+    def __init__(self, limit):
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __call__(self, handler, event, data):
+        async with self._semaphore:
+            return await handler(event, data)
+
+
+def build_webhook_app(bot, dp, secret_token=None, max_concurrent_updates=32, health=None):
+    dp.update.outer_middleware(ConcurrencyLimitMiddleware(max_concurrent_updates))
+
+    app = web.Application()
+    # Апдейт сразу подтверждается Telegram, а обрабатывается в фоне
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret_token).register(app, path=WEBHOOK_PATH)
+
+    async def healthz(request):
+        return web.json_response({"status": "ok", **(health() if health else {})})
+
+    app.router.add_get(HEALTH_PATH, healthz)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bot, dp, base_url, host="0.0.0.0", port=8080, secret_token=None,
+                      max_concurrent_updates=32, health=None):
+    app = build_webhook_app(bot, dp, secret_token, max_concurrent_updates, health)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    url = base_url.rstrip("/") + WEBHOOK_PATH
+    await bot.set_webhook(
+        url,
+        secret_token=secret_token,
+        max_connections=min(max(max_concurrent_updates, 1), 100),
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True,
+    )
+    logger.info(f"🌐 Вебхук слушает {host}:{port}, URL: {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()